@@ -0,0 +1,245 @@
+""" Performance benchmarks of the game engine and the web frontend.
+
+Writes the results as JSON, either to stdout or to the file given with -o.
+With -c, the results are compared to an earlier run and the exit status is
+1 if the throughput of a kingdom dropped by more than -t percent. """
+
+import os
+import sys
+import gc
+import time
+import json
+import shutil
+import optparse
+import platform
+import tempfile
+import subprocess
+import types
+
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_dir)
+
+from domination.simulate import play_game, resolve_kingdom, MAX_ROUNDS
+from domination.gameengine import DominationGame, GameRunner, Player, \
+        AIPlayer, DebugRequest, TLS, ENDED
+from domination.cards import CardTypeRegistry
+from domination.macroimport import CACHE_DIR
+
+
+RESULTS_VERSION = 1
+KINGDOMS = ["First Game [B]", "Big Money [B]", "Interaction [B]",
+            "Size Distortion [B]", "Village Square [B]"]
+SEED = 1
+SHARED_TYPES = (type, types.ModuleType, types.FunctionType,
+                types.BuiltinFunctionType, types.CodeType)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def object_size(obj, shared_ids):
+    """ Returns the bytes taken by obj and the objects reachable from it,
+    skipping code, classes and the objects in shared_ids. """
+    seen = set(shared_ids)
+    size = 0
+    todo = [obj]
+    while todo:
+        obj = todo.pop()
+        if id(obj) in seen or isinstance(obj, SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        todo.extend(gc.get_referents(obj))
+    return size
+
+
+def bench_startup(runs, cold):
+    """ Returns the seconds a new process takes to import the game engine
+    and all cards. If cold is true, the cached macro expansions are removed
+    before every run. """
+    durations = []
+    for _ in xrange(runs):
+        if cold:
+            for dirpath, dirnames, filenames in os.walk(os.path.join(root_dir, "domination")):
+                if CACHE_DIR in dirnames:
+                    shutil.rmtree(os.path.join(dirpath, CACHE_DIR))
+        start = time.time()
+        subprocess.check_call([sys.executable, "-c", "import domination.simulate"],
+                              cwd=root_dir, stderr=open(os.devnull, "w"))
+        durations.append(time.time() - start)
+    return durations
+
+def bench_throughput(kingdom, games):
+    """ Returns the number of games per second two bots play in kingdom. """
+    card_keys = resolve_kingdom(kingdom)
+    start = time.time()
+    for i in xrange(games):
+        play_game((i, card_keys, ["wise", "wise"], MAX_ROUNDS, SEED + i))
+    return games / (time.time() - start)
+
+def bench_request_latency(requests):
+    """ Answers the requests of a player in games against a bot through a
+    GameRunner and returns the seconds until the runner processed the
+    answers, like the web frontend waits for them. """
+    from domination.main import app
+    storage_path = tempfile.mkdtemp()
+    app.game_storage_path = storage_path
+    card_classes = CardTypeRegistry.keys2classes(resolve_kingdom(KINGDOMS[0]))
+    latencies = []
+    try:
+        while len(latencies) < requests:
+            game = DominationGame("benchmark %i" % (len(latencies), ),
+                                  card_classes, SEED + len(latencies))
+            player = Player("benchmark")
+            game.players.append(player)
+            game.players.append(AIPlayer("bot"))
+            runner = GameRunner(game, player)
+            runner.daemon = True
+            runner.start()
+            seqno = runner.seqno
+            while len(latencies) < requests:
+                while not player.request_queue and runner.state != ENDED:
+                    seqno = runner.wait_for_seqno(seqno, 1)
+                if not player.request_queue:
+                    break
+                req = player.request_queue[0]
+                if isinstance(req, DebugRequest):
+                    raise req.exc_info[0], req.exc_info[1], req.exc_info[2]
+                TLS.game = game
+                response = req.choose_wisely()
+                start = time.time()
+                runner.deliver_response(player, response)
+                seqno = req.seqno
+                while seqno <= req.seqno:
+                    seqno = runner.wait_for_seqno(seqno)
+                latencies.append(time.time() - start)
+            runner.cancel()
+            runner.join()
+    finally:
+        app.game_storage_path = None
+        shutil.rmtree(storage_path)
+    return latencies
+
+def bench_render(renders):
+    """ Returns the seconds it takes to render the game page of a running
+    game. """
+    from domination.main import app
+    app.auth_enabled = False
+    storage_path = tempfile.mkdtemp()
+    app.game_storage_path = storage_path
+    client = app.test_client()
+    client.post("/login", data={"username": "benchmark"})
+    client.post("/create_game", data={"name": "benchmark", "ai": "1",
+        "numai": "2", "card_key": resolve_kingdom(KINGDOMS[0])})
+    client.post("/game/start/benchmark")
+    runner = app.games["benchmark"]
+    try:
+        durations = []
+        for _ in xrange(renders):
+            start = time.time()
+            response = client.get("/game/benchmark")
+            durations.append(time.time() - start)
+            assert response.status_code == 200
+    finally:
+        runner.cancel()
+        runner.join()
+        del app.games["benchmark"]
+        app.game_storage_path = None
+        shutil.rmtree(storage_path)
+    return durations
+
+def bench_memory(games):
+    """ Returns the KiB a game of three bots takes after some rounds, not
+    counting the objects that existed before, like the card registry. """
+    from domination.simulate import run_game, choose_wisely
+    card_classes = CardTypeRegistry.keys2classes(resolve_kingdom(KINGDOMS[0]))
+    gc.collect()
+    shared_ids = set(id(obj) for obj in gc.get_objects())
+    size = 0
+    for i in xrange(games):
+        game = DominationGame("memory %i" % (i, ), card_classes, SEED + i)
+        for j in xrange(3):
+            game.players.append(Player("bot %i" % (j, )))
+        run_game(game, dict((p, choose_wisely) for p in game.players), 10)
+        size += object_size(game, shared_ids)
+    return size / 1024.0 / games
+
+
+def run(games, requests, renders, memory_games, startups):
+    metrics = {}
+    def add(name, value, unit, higher_is_better=False):
+        metrics[name] = {"value": value, "unit": unit,
+                         "higher_is_better": higher_is_better}
+    add("startup cold median", percentile(bench_startup(startups, True), 0.5) * 1000, "ms")
+    add("startup median", percentile(bench_startup(startups, False), 0.5) * 1000, "ms")
+    add("memory per game", bench_memory(memory_games), "KiB")
+    for kingdom in KINGDOMS:
+        add("throughput %s" % (kingdom, ), bench_throughput(kingdom, games),
+            "games/s", True)
+    latencies = bench_request_latency(requests)
+    add("request latency median", percentile(latencies, 0.5) * 1000, "ms")
+    add("request latency p95", percentile(latencies, 0.95) * 1000, "ms")
+    durations = bench_render(renders)
+    add("render game.html median", percentile(durations, 0.5) * 1000, "ms")
+    return {"version": RESULTS_VERSION, "time": time.time(),
+            "python": platform.python_version(), "metrics": metrics}
+
+def compare(old, new, threshold):
+    """ Prints the changes between two results and returns the names of the
+    throughput metrics that dropped by more than threshold percent. """
+    regressions = []
+    for name, metric in sorted(new["metrics"].items()):
+        if name not in old["metrics"]:
+            continue
+        old_value = old["metrics"][name]["value"]
+        change = (metric["value"] - old_value) * 100.0 / (old_value or 1e-9)
+        print >>sys.stderr, "%-40s %10.2f -> %10.2f %s (%+.1f%%)" % (name,
+                old_value, metric["value"], metric["unit"], change)
+        if metric["unit"] == "games/s" and change < -threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [options]", description=__doc__)
+    parser.add_option('-n', '--games', dest='games', action='store', type="int",
+            help='number of games per kingdom', default=50)
+    parser.add_option('-r', '--requests', dest='requests', action='store',
+            type="int", help='number of requests to time', default=200)
+    parser.add_option('-R', '--renders', dest='renders', action='store',
+            type="int", help='number of page renders to time', default=50)
+    parser.add_option('-m', '--memory-games', dest='memory_games', action='store',
+            type="int", help='number of games to measure the memory of', default=100)
+    parser.add_option('-s', '--startups', dest='startups', action='store',
+            type="int", help='number of process starts to time', default=5)
+    parser.add_option('-o', '--output', dest='output', action='store',
+            type="string", help='file to write the results to', default=None)
+    parser.add_option('-c', '--compare', dest='compare', action='store',
+            type="string", help='results of an earlier run to compare to', default=None)
+    parser.add_option('-t', '--threshold', dest='threshold', action='store',
+            type="float", help='tolerated throughput drop in percent', default=10.0)
+
+    options, args = parser.parse_args(argv)
+    if args:
+        parser.error("don't know what to do with additional arguments")
+
+    results = run(options.games, options.requests, options.renders,
+                  options.memory_games, options.startups)
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, "w") as f:
+            f.write(data + "\n")
+    else:
+        print data
+    if options.compare:
+        with open(options.compare) as f:
+            old = json.load(f)
+        regressions = compare(old, results, options.threshold)
+        if regressions:
+            print >>sys.stderr, "throughput regressed by more than %.1f%%: %s" % (
+                    options.threshold, ", ".join(regressions))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,4 +1,3 @@
 # enable macros
-import karnickel
-karnickel.install_hook()
-
+from domination import macroimport
+macroimport.install_hook()
@@ -0,0 +1,215 @@
+""" Statistics over the results of simulated games, e.g. which card sets are
+balanced and how often the buyers of a card win. The results are counted
+into columns, one array per counter with a row per card set or card, so
+adding a batch of games only costs these games, however many were counted
+before. The columns are stored in one file, a JSON header line followed by
+the arrays in native byte order.
+
+$ python domination/simulate.py -n 1000 "First Game [B]" | python domination/analytics.py stats.bin
+adds 1000 games to stats.bin, which the server shows at /stats if started
+with -T stats.bin. """
+
+import os
+import sys
+import json
+import optparse
+from array import array
+
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_dir)
+
+from domination.gameengine import DominationGame, PROVINCES_EMPTY, \
+        COLONIES_EMPTY, PILES_EMPTY, ROUND_LIMIT
+from domination.cards import manifest
+
+
+# bump if the columns change
+VERSION = 1
+END_REASONS = [PROVINCES_EMPTY, COLONIES_EMPTY, PILES_EMPTY, ROUND_LIMIT]
+SEATS = range(DominationGame.MAX_PLAYERS)
+# the row of the games whose kingdom is no card set
+OTHER_KINGDOMS = ""
+
+END_COLUMNS = dict((reason, "end %s" % (reason, )) for reason in END_REASONS)
+SEATED_COLUMNS = ["seated %i" % (seat, ) for seat in SEATS]
+WINS_COLUMNS = ["wins %i" % (seat, ) for seat in SEATS]
+KINGDOM_COLUMNS = (["games", "errors", "ties", "rounds", "rounds_squared"] +
+                   [END_COLUMNS[reason] for reason in END_REASONS] +
+                   SEATED_COLUMNS + WINS_COLUMNS)
+# games counts the games the card was in the kingdom or bought, buyers the
+# players that bought it at least once
+CARD_COLUMNS = ["games", "buys", "buyers", "buyer wins"]
+
+
+class Table(object):
+    """ Counters in columns, keys names the rows. """
+    def __init__(self, names, keys=(), columns=None):
+        self.keys = list(keys)
+        self.index = dict((key, i) for i, key in enumerate(self.keys))
+        if columns is None:
+            columns = dict((name, array("d", [0] * len(self.keys))) for name in names)
+        self.names = names
+        self.columns = columns
+
+    def row(self, key):
+        """ Returns the index of the row of key, which is added if needed. """
+        try:
+            return self.index[key]
+        except KeyError:
+            pass
+        i = self.index[key] = len(self.keys)
+        self.keys.append(key)
+        for column in self.columns.itervalues():
+            column.append(0)
+        return i
+
+    def add(self, key, name, value=1):
+        self.columns[name][self.row(key)] += value
+
+    def merge(self, other):
+        for j, key in enumerate(other.keys):
+            i = self.row(key)
+            for name, column in other.columns.iteritems():
+                self.columns[name][i] += column[j]
+
+    def rows(self):
+        """ Yields (key, dict of the counters) for every row. """
+        for i, key in enumerate(self.keys):
+            yield key, dict((name, column[i]) for name, column in self.columns.iteritems())
+
+    def write(self, f):
+        for name in self.names:
+            self.columns[name].tofile(f)
+
+    @classmethod
+    def read(cls, f, names, keys):
+        columns = {}
+        for name in names:
+            columns[name] = array("d")
+            columns[name].fromfile(f, len(keys))
+        return cls(names, keys, columns)
+
+
+class Stats(object):
+    def __init__(self):
+        self.kingdoms = Table(KINGDOM_COLUMNS)
+        self.cards = Table(CARD_COLUMNS)
+        self.card_sets = dict((tuple(sorted(keys)), name)
+                              for name, keys in manifest.card_set_keys)
+
+    def add(self, result):
+        """ Counts the result dict of a game, see simulate.play_game. """
+        kingdom = self.card_sets.get(tuple(sorted(result["kingdom"])), OTHER_KINGDOMS)
+        i = self.kingdoms.row(kingdom)
+        columns = self.kingdoms.columns
+        columns["games"][i] += 1
+        if result["error"]:
+            columns["errors"][i] += 1
+            return
+        columns["rounds"][i] += result["rounds"]
+        columns["rounds_squared"][i] += result["rounds"] ** 2
+        if result["end_reason"] in END_COLUMNS:
+            columns[END_COLUMNS[result["end_reason"]]][i] += 1
+        players = result["players"]
+        for name in SEATED_COLUMNS[:len(players)]:
+            columns[name][i] += 1
+        if result["winner"] is None:
+            columns["ties"][i] += 1
+        else:
+            columns[WINS_COLUMNS[players.index(result["winner"])]][i] += 1
+        buys = result.get("buys") or [{} for _ in players]
+        keys = set(result["kingdom"])
+        for player_buys in buys:
+            keys.update(player_buys)
+        for key in keys:
+            self.cards.add(key, "games")
+        for name, player_buys in zip(players, buys):
+            for key, count in player_buys.iteritems():
+                self.cards.add(key, "buys", count)
+                self.cards.add(key, "buyers")
+                if name == result["winner"]:
+                    self.cards.add(key, "buyer wins")
+
+    def merge(self, other):
+        self.kingdoms.merge(other.kingdoms)
+        self.cards.merge(other.cards)
+
+    def kingdom_rows(self):
+        """ Returns dicts describing the card sets, the seats win rates
+        spread tells how balanced a set is for the strategies played. """
+        rows = []
+        for key, row in self.kingdoms.rows():
+            games = row["games"] - row["errors"]
+            mean = row["rounds"] / games if games else 0.0
+            variance = row["rounds_squared"] / games - mean ** 2 if games else 0.0
+            win_rates = [row[WINS_COLUMNS[seat]] / row[SEATED_COLUMNS[seat]]
+                         for seat in SEATS if row[SEATED_COLUMNS[seat]]]
+            rows.append({
+                "name": key, "games": int(row["games"]), "errors": int(row["errors"]),
+                "rounds": mean, "rounds_deviation": max(variance, 0.0) ** 0.5,
+                "end_reasons": dict((reason, row[END_COLUMNS[reason]] / games if games else 0.0)
+                                    for reason in END_REASONS),
+                "ties": row["ties"] / games if games else 0.0,
+                "win_rates": win_rates,
+                "spread": max(win_rates) - min(win_rates) if win_rates else 0.0,
+            })
+        rows.sort(key=lambda row: (row["name"] == OTHER_KINGDOMS, row["name"]))
+        return rows
+
+    def card_rows(self):
+        """ Returns dicts describing the cards, the most winning first. """
+        rows = []
+        for key, row in self.cards.rows():
+            rows.append({
+                "key": key, "games": int(row["games"]), "buyers": int(row["buyers"]),
+                "buys": row["buys"] / row["games"] if row["games"] else 0.0,
+                "buyer_win_rate": row["buyer wins"] / row["buyers"] if row["buyers"] else 0.0,
+            })
+        rows.sort(key=lambda row: (-row["buyer_win_rate"], row["key"]))
+        return rows
+
+    def save(self, path):
+        header = {"version": VERSION, "kingdoms": self.kingdoms.keys,
+                  "cards": self.cards.keys}
+        tmp_path = "%s.%i.tmp" % (path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(header) + "\n")
+            self.kingdoms.write(f)
+            self.cards.write(f)
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        stats = cls()
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != VERSION:
+                raise ValueError("Unsupported statistics version %r" % (header.get("version"), ))
+            stats.kingdoms = Table.read(f, KINGDOM_COLUMNS, header["kingdoms"])
+            stats.cards = Table.read(f, CARD_COLUMNS, [str(key) for key in header["cards"]])
+        return stats
+
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [options] STATS_FILE [RESULTS_FILE ...]",
+            description="Adds the results of simulate.py, read from the"
+            " RESULTS_FILEs or stdin, to STATS_FILE.")
+    options, args = parser.parse_args(argv)
+    if not args:
+        parser.error("need the statistics file")
+    path = args[0]
+    if os.path.exists(path):
+        stats = Stats.load(path)
+    else:
+        stats = Stats()
+    games = 0
+    for f in [open(name) for name in args[1:]] or [sys.stdin]:
+        for line in f:
+            if line.strip():
+                stats.add(json.loads(line))
+                games += 1
+    stats.save(path)
+    print >>sys.stderr, "Added %i games to %s" % (games, path)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
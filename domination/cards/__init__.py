@@ -2,6 +2,7 @@ import copy
 
 from domination.gameengine import Defended, TLS
 from domination.tools import _
+from domination.cards import manifest
 
 from domination.macros.__macros__ import generator_forward, generator_forward_ex
 
@@ -22,6 +23,20 @@ Hinterlands = Edition('hinterlands', _("Hinterlands game"))
 editions = [BaseGame, Intrigue, Alchemy, Seaside, Prosperity, Cornucopia, Hinterlands]
 
 
+class CardFeatures(object):
+    """ What the action of a card class does, derived from the names its
+    activate_action refers to. The AI sorts by these. """
+    __slots__ = ("gives_actions", "plays_actions", "draws", "trashes", "attack")
+
+    def __init__(self, kls):
+        names = kls.activate_action.im_func.func_code.co_names
+        self.gives_actions = "remaining_actions" in names
+        self.plays_actions = "SelectActionCard" in names # throne room
+        self.draws = "draw_cards" in names
+        self.trashes = "trash" in names or "trash_pile" in names
+        self.attack = any(b.__name__ == "AttackCard" for b in kls.__mro__)
+
+
 class CardTypeRegistry(type):
     raw_card_classes = {}
 
@@ -35,30 +50,40 @@ class CardTypeRegistry(type):
         if name != "Card":
             cost = d.pop("cost", None)
             d["raw_cost"] = cost
+        # lets instances use the key of their class as __name__
+        d["__name__"] = name
         kls = type.__new__(cls, name, orig_bases, d)
+        kls.features = CardFeatures(kls)
         if not abstract:
             CardTypeRegistry.raw_card_classes[name] = kls
         return kls
 
+    # prefer game.card_cost and game.change_cost, these need TLS.game
     def _get_cost(self):
-        if getattr(TLS, "game", None) is None:
+        game = getattr(TLS, "game", None)
+        if game is None:
             return self.raw_cost
-        return self.raw_cost + TLS.game.cost_delta.get(self.__name__, 0)
+        return game.card_cost(self)
     def _set_cost(self, value):
-        cd = TLS.game.cost_delta
-        cd[self.__name__] = value - self.raw_cost
+        TLS.game.change_cost(self, value - self.cost)
     cost = property(_get_cost, _set_cost)
 
     @staticmethod
     def keys2classes(keys):
         classes = []
         for key in keys:
-            cls = CardTypeRegistry.raw_card_classes[key]
+            try:
+                cls = CardTypeRegistry.raw_card_classes[key]
+            except KeyError:
+                # the module of the card was not imported yet
+                manifest.import_module(manifest.cards[key].module)
+                cls = CardTypeRegistry.raw_card_classes[key]
             classes.append(cls)
         return classes
 
     @staticmethod
     def cards_from_edition(edition):
+        manifest.load_all()
         return [c for c in CardTypeRegistry.raw_card_classes.values() if c.edition == edition and c.implemented]
 
 class Card(object):
@@ -77,7 +102,6 @@ class Card(object):
     __slots__ = ()
 
     def __init__(self):
-        self.__name__ = type(self).__name__
         assert self.name != "UNKNOWN"
         assert self.cost is not None or self.__class__.__dict__.get("get_cost")
         assert self.points is not None or self.__class__.__dict__.get("get_points")
@@ -110,6 +134,8 @@ class Card(object):
 
     @classmethod
     def get_cost(self, game=None, player=None):
+        if game is not None:
+            return game.card_cost(self)
         return self.cost
 
     def get_worth(self, player):
@@ -2,7 +2,7 @@ from domination.cards import TreasureCard, VictoryCard, ActionCard, \
      AttackCard, ReactionCard, CardSet, Alchemy
 from domination.cards.base import Duchy, Estate, Copper, Gold
 from domination.gameengine import SelectHandCards, Question, MultipleChoice, \
-     InfoRequest, SelectCard, Defended, YesNoQuestion
+     InfoRequest, SelectCard, Defended, YesNoQuestion, INTENT_TRASH
 from domination.tools import _
 from domination.macros.__macros__ import handle_defense, generator_forward,\
         fetch_card_from_supply
@@ -90,13 +90,13 @@ class Apprentice(ActionCard):
         player.remaining_actions += 1
         if player.hand:
             cards = yield SelectHandCards(game, player, count_lower=1, count_upper=1,
-                    msg=_("Which card do you want to trash?"))
+                    intent=INTENT_TRASH, msg=_("Which card do you want to trash?"))
         else:
             return
         # trash card
         if cards:
             card = cards[0]
-            drawcount = card.cost
+            drawcount = game.card_cost(card)
             if card.potioncost:
                 drawcount += 2
             card.trash(game, player)
@@ -287,7 +287,7 @@ class Transmute(ActionCard):
         if not player.hand:
             return
         cards = yield SelectHandCards(game, player, count_lower=1, count_upper=1,
-                msg=_("Which card do you want to trash?"))
+                intent=INTENT_TRASH, msg=_("Which card do you want to trash?"))
         if cards:
             card = cards[0]
             for info_player in game.following_participants(player):
@@ -323,10 +323,8 @@ class University(ActionCard):
 
     def activate_action(self, game, player):
         player.remaining_actions += 2
-        card_classes = [c for c in game.card_classes.itervalues()
-                        if c.cost <= 5 and c.potioncost == 0 and
-                        game.supply.get(c.__name__) and
-                        issubclass(c, ActionCard)]
+        card_classes = game.gainable_card_classes(max_cost=5, potioncost=0,
+                                                  cls=ActionCard)
         card_cls = yield SelectCard(game, player, card_classes=card_classes,
             msg=_("Select a action card that you want to have."), show_supply_count=True)
         if card_cls:
@@ -1,7 +1,7 @@
 from domination.cards import TreasureCard, VictoryCard, CurseCard, ActionCard, \
      AttackCard, ReactionCard, CardSet, BaseGame
 from domination.gameengine import InfoRequest, SelectCard, SelectHandCards, \
-     YesNoQuestion, Defended, SelectActionCard
+     YesNoQuestion, Defended, SelectActionCard, INTENT_TRASH, INTENT_DISCARD
 from domination.tools import _
 from domination.macros.__macros__ import handle_defense, generator_forward
 
@@ -75,7 +75,7 @@ class Chapel(ActionCard):
     def activate_action(self, game, player):
         if player.hand:
             cards = yield SelectHandCards(game, player, count_lower=1, count_upper=4,
-                    msg=_("Which cards do you want to trash?"))
+                    intent=INTENT_TRASH, msg=_("Which cards do you want to trash?"))
         else:
             return
         # trash cards
@@ -135,7 +135,7 @@ class Militia(AttackCard):
             if count <= 0:
                 continue
             cards = yield SelectHandCards(game, other_player, count_lower=count, count_upper=count,
-                    msg=_("%s played Militia. Which cards do you want to discard?", (player.name, )))
+                    intent=INTENT_DISCARD, msg=_("%s played Militia. Which cards do you want to discard?", (player.name, )))
             for card in cards:
                 card.discard(other_player)
             for info_player in game.participants:
@@ -157,10 +157,8 @@ class Mine(ActionCard):
                     msg=_("Select a treasure card you want to convert to a potentially better card."))
         if cards:
             card = cards[0]
-            card_classes = [c for c in game.card_classes.itervalues()
-                            if c.cost <= card.cost + 3 and
-                            game.supply.get(c.__name__) and
-                            issubclass(c, TreasureCard)]
+            card_classes = game.gainable_card_classes(
+                max_cost=game.card_cost(card) + 3, cls=TreasureCard)
             card_cls = yield SelectCard(game, player, card_classes=card_classes,
                 msg=_("Select a treasure card that you want to have."), show_supply_count=True)
             card.trash(game, player)
@@ -201,13 +199,12 @@ class Remodel(ActionCard):
             return
         cards = yield SelectHandCards(game, player,
                     count_lower=0, count_upper=1,
-                    msg=_("Select a card you want to trash."))
+                    intent=INTENT_TRASH, msg=_("Select a card you want to trash."))
         if cards:
             card = cards[0]
-            card_cls = yield SelectCard(game, player, card_classes=[c for c in
-                game.card_classes.itervalues()
-                if c.cost <= card.cost + 2 and game.supply.get(c.__name__)
-                and c.potioncost == card.potioncost],
+            card_cls = yield SelectCard(game, player,
+                card_classes=game.gainable_card_classes(
+                    max_cost=game.card_cost(card) + 2, potioncost=card.potioncost),
                 msg=_("Select a card that you want to have."), show_supply_count=True)
             card.trash(game, player)
             new_card = game.supply[card_cls.__name__].pop()
@@ -333,9 +330,8 @@ class Feast(ActionCard):
     desc = _("Trash this card, gain a card costing up to 5.")
 
     def activate_action(self, game, player):
-        card_cls = yield SelectCard(game, player, card_classes=[c for c in
-            game.card_classes.itervalues() if c.cost <= 5 and
-            game.supply.get(c.__name__) and c.potioncost == 0],
+        card_cls = yield SelectCard(game, player,
+            card_classes=game.gainable_card_classes(max_cost=5, potioncost=0),
             msg=_("Select a card that you want to have."), show_supply_count=True)
         new_card = game.supply[card_cls.__name__].pop()
         player.discard_pile.append(new_card)
@@ -459,7 +455,8 @@ class Thief(AttackCard):
                 yield InfoRequest(game, info_player, _("%s reveals the top 2 cards of his deck:",
                         (other_player.name, )), cards[:])
             treasure_cards = [c for c in cards if isinstance(c, TreasureCard)]
-            treasure_card_classes = list(set([type(c) for c in treasure_cards]))
+            treasure_card_classes = sorted(set([type(c) for c in treasure_cards]),
+                                           key=lambda c: c.__name__)
             if treasure_cards:
                 card_cls = (yield SelectCard(game, player,
                     _("Which card of the player %s do you want to trash?",
@@ -490,7 +487,7 @@ class ThroneRoom(ActionCard):
     def activate_action(self, game, player):
         if not [c for c in player.hand if isinstance(c, ActionCard)]:
             return
-        action_cards = (yield SelectActionCard(self, player,
+        action_cards = (yield SelectActionCard(game, player,
             _("Which action card do you want to play on the throne room? (%i actions left)",
                (player.remaining_actions, ))))
         if action_cards:
@@ -546,9 +543,8 @@ class Workshop(ActionCard):
     desc = _("Gain a card costing up to 4.")
 
     def activate_action(self, game, player):
-        card_cls = yield SelectCard(game, player, card_classes=[c for c in
-            game.card_classes.itervalues() if c.cost <= 4 and
-            game.supply.get(c.__name__) and c.potioncost == 0],
+        card_cls = yield SelectCard(game, player,
+            card_classes=game.gainable_card_classes(max_cost=4, potioncost=0),
             msg=_("Select a card that you want to have."), show_supply_count=True)
         new_card = game.supply[card_cls.__name__].pop()
         player.discard_pile.append(new_card)
@@ -2,7 +2,8 @@ from domination.cards import TreasureCard, VictoryCard, CurseCard, ActionCard, \
      AttackCard, ReactionCard, PrizeCard, CardSet, Cornucopia, CardTypeRegistry
 from domination.cards.base import Curse, Duchy, Province
 from domination.gameengine import InfoRequest, SelectCard, SelectHandCards, \
-     MultipleChoice, Question, YesNoQuestion, Defended, SelectActionCard
+     MultipleChoice, Question, YesNoQuestion, Defended, SelectActionCard, \
+     INTENT_TRASH
 from domination.tools import _
 from domination.macros.__macros__ import handle_defense, generator_forward, fetch_card_from_supply
 
@@ -186,9 +187,8 @@ class HornOfPlenty(TreasureCard):
 
     def activate_action(self, game, player):
         money = len(set(card.__name__ for card in player.aux_cards))
-        card_cls = yield SelectCard(game, player, card_classes=[c for c in
-            game.card_classes.itervalues() if c.cost <= money and
-            game.supply.get(c.__name__) and c.potioncost == 0],
+        card_cls = yield SelectCard(game, player,
+            card_classes=game.gainable_card_classes(max_cost=money, potioncost=0),
             msg=_("Select a card that you want to have."), show_supply_count=True)
         new_card = game.supply[card_cls.__name__].pop()
         player.discard_pile.append(new_card)
@@ -334,12 +334,12 @@ class Princess(PrizeCard, ActionCard):
         player.remaining_deals += 1
         decreased_for_cards = []
         for card in game.card_classes.itervalues():
-            if card.cost >= 2:
-                card.cost -= 2
+            if game.card_cost(card) >= 2:
+                game.change_cost(card, -2)
                 decreased_for_cards.append(card)
         def restore_cards(player):
             for card in decreased_for_cards:
-                card.cost += 2
+                game.change_cost(card, 2)
         player.register_turn_cleanup(restore_cards)
 
 class Remake(ActionCard):
@@ -352,13 +352,11 @@ class Remake(ActionCard):
         for i in range(0,2):
             cards = yield SelectHandCards(game, player,
                         count_lower=1, count_upper=1,
-                        msg=_("Select a card you want to trash."))
+                        intent=INTENT_TRASH, msg=_("Select a card you want to trash."))
             if cards:
                 card = cards[0]
-                card_classes = [c for c in game.card_classes.itervalues()
-                                if c.cost == card.cost + 1 and
-                                game.supply.get(c.__name__) and
-                                c.potioncost == card.potioncost]
+                card_classes = game.gainable_card_classes(
+                    cost=game.card_cost(card) + 1, potioncost=card.potioncost)
 
                 card.trash(game, player)
                 if card_classes:
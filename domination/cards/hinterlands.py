@@ -3,7 +3,7 @@ from domination.cards import TreasureCard, VictoryCard, CurseCard, ActionCard, \
 from domination.cards.base import Duchy, Copper, Silver, Gold, Province, Curse
 from domination.cards.prosperity import Platinum
 from domination.gameengine import InfoRequest, SelectCard, SelectHandCards, \
-     YesNoQuestion, Question, Defended, SelectActionCard
+     YesNoQuestion, Question, Defended, SelectActionCard, INTENT_TRASH
 from domination.tools import _
 from domination.macros.__macros__ import handle_defense, generator_forward, fetch_card_from_supply
 
@@ -23,9 +23,7 @@ class BorderVillage(ActionCard):
         if not isinstance(card, BorderVillage):
             return
 
-        card_classes = [c for c in game.card_classes.itervalues()
-                        if c.cost < cls.cost and
-                        game.supply.get(c.__name__)]
+        card_classes = game.gainable_card_classes(max_cost=game.card_cost(cls) - 1)
         card_cls = yield SelectCard(game, player, card_classes=card_classes,
             msg=_("Select a card that you want to have."), show_supply_count=True)
         with fetch_card_from_supply(game, card_cls) as new_card:
@@ -114,22 +112,18 @@ class Develop(ActionCard):
     def activate_action(self, game, player):
         cards = yield SelectHandCards(game, player,
                     count_lower=1, count_upper=1,
-                    msg=_("Select a card you want to trash for a better and a worse card."))
+                    intent=INTENT_TRASH, msg=_("Select a card you want to trash for a better and a worse card."))
         new_cards = []
         if cards:
             card = cards[0]
-            card_classes = [c for c in game.card_classes.itervalues()
-                            if c.cost == card.cost + 1 and
-                            game.supply.get(c.__name__)]
+            card_classes = game.gainable_card_classes(cost=game.card_cost(card) + 1)
             if card_classes:
                 card_cls = yield SelectCard(game, player, card_classes=card_classes,
                     msg=_("Select a card that you want to have."), show_supply_count=True)
                 new_cards.append(game.supply[card_cls.__name__].pop())
                 for val in game.check_empty_pile(card_cls.__name__):
                     yield val
-            card_classes = [c for c in game.card_classes.itervalues()
-                            if c.cost == card.cost - 1 and
-                            game.supply.get(c.__name__)]
+            card_classes = game.gainable_card_classes(cost=game.card_cost(card) - 1)
             if card_classes:
                 card_cls = yield SelectCard(game, player, card_classes=card_classes,
                     msg=_("Select a card that you want to have."), show_supply_count=True)
@@ -213,9 +207,7 @@ class Farmland(VictoryCard):
                     msg=_("Select a card you want to convert to a 2 Money more expensive Card."))
         if cards:
             card = cards[0]
-            card_classes = [c for c in game.card_classes.itervalues()
-                            if c.cost == card.cost + 2 and
-                            game.supply.get(c.__name__)]
+            card_classes = game.gainable_card_classes(cost=game.card_cost(card) + 2)
             card_cls = yield SelectCard(game, player, card_classes=card_classes,
                 msg=_("Select a treasure card that you want to have."), show_supply_count=True)
             card.trash(game, player)
@@ -352,7 +344,7 @@ class JackOfAllTrades(ActionCard):
         #FIXME only cards that are no treasure
         cards = yield SelectHandCards(game, player,
                     count_lower=0, count_upper=1, not_selectable=[c for c in player.hand if isinstance(c, TreasureCard)],
-                    msg=_("Select a card you want to trash."))
+                    intent=INTENT_TRASH, msg=_("Select a card you want to trash."))
         if cards:
             card = cards[0]
             card.trash(game, player)
@@ -573,7 +565,7 @@ class SpiceMerchant(ActionCard):
     def activate_action(self, game, player):
         cards = yield SelectHandCards(game, player, cls=TreasureCard,
                     count_lower=0, count_upper=1,
-                    msg=_("Select a treasure card you want to trash."))
+                    intent=INTENT_TRASH, msg=_("Select a treasure card you want to trash."))
         if cards:
             card = cards[0]
             card.trash(game, player)
@@ -2,7 +2,7 @@ from domination.cards import TreasureCard, VictoryCard, ActionCard, \
      AttackCard, ReactionCard, CardSet, Intrigue
 from domination.cards.base import Duchy, Estate, Copper, Curse
 from domination.gameengine import SelectHandCards, Question, MultipleChoice, \
-     InfoRequest, SelectCard, Defended, YesNoQuestion
+     InfoRequest, SelectCard, Defended, YesNoQuestion, INTENT_TRASH
 from domination.tools import _
 from domination.macros.__macros__ import handle_defense, generator_forward,\
         fetch_card_from_supply
@@ -48,12 +48,12 @@ class Bridge(ActionCard):
         player.virtual_money += 1
         decreased_for_cards = []
         for card in game.card_classes.itervalues():
-            if card.cost >= 1:
-                card.cost -= 1
+            if game.card_cost(card) >= 1:
+                game.change_cost(card, -1)
                 decreased_for_cards.append(card)
         def restore_cards(player):
             for card in decreased_for_cards:
-                card.cost += 1
+                game.change_cost(card, 1)
         player.register_turn_cleanup(restore_cards)
 
 
@@ -143,9 +143,8 @@ class Ironworks(ActionCard):
 
     def activate_action(self, game, player):
         # copied from Feast
-        card_cls = yield SelectCard(game, player, card_classes=[c for c in
-            game.card_classes.itervalues() if c.cost <= 4 and
-            game.supply.get(c.__name__) and c.potioncost == 0],
+        card_cls = yield SelectCard(game, player,
+            card_classes=game.gainable_card_classes(max_cost=4, potioncost=0),
             msg=_("Select a card that you want to have."), show_supply_count=True)
         new_card = game.supply[card_cls.__name__].pop()
         player.discard_pile.append(new_card)
@@ -188,7 +187,7 @@ class Masquerade(ActionCard):
 
         if player.hand:
             cards = yield SelectHandCards(game, player, count_lower=0, count_upper=1,
-                    msg=_("Which card do you want to trash?"))
+                    intent=INTENT_TRASH, msg=_("Which card do you want to trash?"))
         # trash cards
         if cards:
             for card in cards:
@@ -349,19 +348,19 @@ class Saboteur(AttackCard):
                     break
                 card = other_player.hand.pop()
                 revealed_cards.append(card)
-                cost = card.cost
+                cost = game.card_cost(card)
             for info_player in game.participants:
                 yield InfoRequest(game, info_player, _("%s reveals these cards:",
                 (other_player.name, )), revealed_cards)
             # last card in revealed cards is the one costing 3 or more
             # except if the deck is empty
-            if revealed_cards and revealed_cards[-1].cost >= 3:
+            if revealed_cards and game.card_cost(revealed_cards[-1]) >= 3:
                 game.trash_pile.append(revealed_cards[-1])
 
                 # gain a card, XXX missing cancel
-                card_cls = yield SelectCard(game, other_player, card_classes=[c for c in
-                    game.card_classes.itervalues() if c.cost <= revealed_cards[-1].cost - 2 and
-                    game.supply.get(c.__name__) and c.potioncost == 0],
+                card_cls = yield SelectCard(game, other_player,
+                    card_classes=game.gainable_card_classes(
+                        max_cost=game.card_cost(revealed_cards[-1]) - 2, potioncost=0),
                     msg=_("Select a card that you want to have."), show_supply_count=True)
                 new_card = game.supply[card_cls.__name__].pop()
                 other_player.discard_pile.append(new_card)
@@ -476,9 +475,8 @@ class Swindler(AttackCard):
                 yield InfoRequest(game, info_player, _("%s trashes:",
                         (other_player.name, )), [card])
 
-            req = SelectCard(game, player, card_classes=[c for c in
-                game.card_classes.itervalues() if c.cost == card.cost and
-                game.supply.get(c.__name__)],
+            req = SelectCard(game, player,
+                card_classes=game.gainable_card_classes(cost=game.card_cost(card)),
                 msg=_("Select a card that you want to give."), show_supply_count=True)
             if not req.fulfillable():
                 continue
@@ -518,7 +516,7 @@ class Steward(ActionCard):
         elif answer == "trash":
             if player.hand:
                 cards = yield SelectHandCards(game, player, count_lower=2, count_upper=2,
-                        msg=_("Which cards do you want to trash?"))
+                        intent=INTENT_TRASH, msg=_("Which cards do you want to trash?"))
             else:
                 return
             # trash cards
@@ -577,7 +575,7 @@ class TradingPost(ActionCard):
     def activate_action(self, game, player):
         if player.hand:
             cards = yield SelectHandCards(game, player, count_lower=2, count_upper=2,
-                    msg=_("Which cards do you want to trash?"))
+                    intent=INTENT_TRASH, msg=_("Which cards do you want to trash?"))
         else:
             return
         # trash cards
@@ -638,10 +636,11 @@ class Upgrade(ActionCard):
             return
         cards = yield SelectHandCards(game, player,
                     count_lower=0, count_upper=1,
-                    msg=_("Select a card you want to trash."))
+                    intent=INTENT_TRASH, msg=_("Select a card you want to trash."))
         if cards:
             card = cards[0]
-            selectable_card_classes=[c for c in game.card_classes.itervalues() if c.cost == card.cost + 1 and game.supply.get(c.__name__) and c.potioncost == card.potioncost]
+            selectable_card_classes = game.gainable_card_classes(
+                cost=game.card_cost(card) + 1, potioncost=card.potioncost)
             new_card = None
             if selectable_card_classes:
                 card_cls = yield SelectCard(game, player, card_classes=selectable_card_classes,
@@ -0,0 +1,89 @@
+""" The module, edition, costs and types of every card, read from
+manifest.json, and the keys of the card sets. With these, the engine only
+imports the card modules a game uses, see CardTypeRegistry.keys2classes.
+Run this module after changing cards to write manifest.json again, the tests
+check that it is up to date. """
+
+import os
+import sys
+import json
+from collections import namedtuple
+
+
+# the modules of the editions below domination.cards
+MODULES = ["base", "intrigue", "alchemy", "seaside", "prosperity", "cornucopia",
+           "hinterlands"]
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "manifest.json")
+
+CardInfo = namedtuple("CardInfo", "module edition cost potioncost card_type "
+                      "second_card_type optional implemented")
+
+
+def read(path=PATH):
+    """ Returns a dict mapping the card keys to CardInfos and a list of
+    (card set name, card keys) tuples. """
+    with open(path) as f:
+        data = json.load(f)
+    cards = dict((str(key), CardInfo(*info)) for key, info in data["cards"].iteritems())
+    return cards, [(name, [str(key) for key in keys]) for name, keys in data["card_sets"]]
+
+try:
+    cards, card_set_keys = read()
+except IOError:
+    # before the first run of this module
+    cards, card_set_keys = {}, []
+
+
+def import_module(name):
+    return __import__("domination.cards." + name, None, None, ["card_sets"])
+
+def load_all():
+    """ Imports the modules of all editions. """
+    for name in MODULES:
+        import_module(name)
+
+def get_card_sets():
+    """ Returns the CardSets of all editions. """
+    card_sets = []
+    for name in MODULES:
+        card_sets.extend(import_module(name).card_sets)
+    return card_sets
+
+def kingdom_keys():
+    """ Returns the keys of the cards that can be selected for a game. """
+    return [key for key, info in cards.iteritems() if info.optional and info.implemented]
+
+
+def build():
+    """ Imports all editions and returns the data of manifest.json. """
+    from domination.cards import CardTypeRegistry
+    load_all()
+    data = {"cards": {}, "card_sets": []}
+    for key, cls in CardTypeRegistry.raw_card_classes.iteritems():
+        module = cls.__module__.rsplit(".", 1)[-1]
+        if module in MODULES:
+            data["cards"][key] = list(CardInfo(module, cls.edition.key, cls.raw_cost,
+                cls.potioncost, cls.card_type, cls.second_card_type,
+                cls.optional, cls.implemented))
+    for card_set in get_card_sets():
+        data["card_sets"].append([card_set.name.pristine_str,
+                                  [cls.__name__ for cls in card_set.card_classes]])
+    return data
+
+def write(path=PATH):
+    data = build()
+    # one card or card set per line to keep the diffs readable
+    cards = ",\n".join("  %s: %s" % (json.dumps(key), json.dumps(info))
+                       for key, info in sorted(data["cards"].iteritems()))
+    card_sets = ",\n".join("  %s" % (json.dumps(card_set), )
+                           for card_set in data["card_sets"])
+    with open(path, "w") as f:
+        f.write('{\n "cards": {\n%s\n },\n "card_sets": [\n%s\n ]\n}\n' % (
+                cards, card_sets))
+
+if __name__ == '__main__':
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+    # the cards need to be imported through the game engine
+    import domination.gameengine
+    from domination.cards import manifest
+    manifest.write()
@@ -3,7 +3,7 @@ from domination.cards import TreasureCard, VictoryCard, CurseCard, ActionCard, \
 from domination.cards.base import Duchy, Estate, Copper, Province, Curse
 from domination.gameengine import SelectHandCards, Question, MultipleChoice, \
      InfoRequest, SelectCard, Defended, YesNoQuestion, \
-     SelectActionCard
+     SelectActionCard, INTENT_TRASH
 from domination.tools import _
 from domination.macros.__macros__ import handle_defense, generator_forward,\
         fetch_card_from_supply
@@ -37,7 +37,7 @@ class TradeRoute(ActionCard):
             return
         cards = yield SelectHandCards(game, player,
                     count_lower=1, count_upper=1,
-                    msg=_("Select a card you want to trash."))
+                    intent=INTENT_TRASH, msg=_("Select a card you want to trash."))
         if cards:
             card = cards[0]
             card.trash(game, player)
@@ -110,17 +110,17 @@ class Bishop(ActionCard):
         if player.hand:
             cards = yield SelectHandCards(game, player,
                         count_lower=0, count_upper=1,
-                        msg=_("Select a card you want to trash."))
+                        intent=INTENT_TRASH, msg=_("Select a card you want to trash."))
             if cards:
                 card = cards[0]
-                player.tokens += card.cost / 2
+                player.tokens += game.card_cost(card) / 2
                 card.trash(game, player)
                 for info_player in game.following_participants(player):
                     yield InfoRequest(game, info_player,
                             _("%s trashes:", (player.name, )), [card])
         for other_player in game.following_players(player):
             cards = yield SelectHandCards(game, other_player, count_lower=0, count_upper=1,
-                    msg=_("%s played Bishop. You may trash a card:", (player.name, )))
+                    intent=INTENT_TRASH, msg=_("%s played Bishop. You may trash a card:", (player.name, )))
             if cards:
                 for card in cards:
                     card.trash(game, other_player)
@@ -151,15 +151,15 @@ class Quarry(TreasureCard):
         action_card_classes  = [cls for cls in game.card_classes.itervalues()
                     if issubclass(cls, ActionCard)]
         for card in action_card_classes:
-            if card.cost >= 1:
-                card.cost -= 1
+            if game.card_cost(card) >= 1:
+                game.change_cost(card, -1)
                 decreased_for_cards.append(card)
-            if card.cost >= 1:
-                card.cost -= 1
+            if game.card_cost(card) >= 1:
+                game.change_cost(card, -1)
                 decreased_for_cards.append(card)
         def restore_cards(player):
             for card in decreased_for_cards:
-                card.cost += 1
+                game.change_cost(card, 1)
         player.register_turn_cleanup(restore_cards)
 
 class Talisman(TreasureCard):
@@ -177,7 +177,7 @@ class Talisman(TreasureCard):
     def on_buy_card(cls, game, player, card):
         for c in player.aux_cards:
             if isinstance(c, Talisman):
-                if not isinstance(card, VictoryCard) and card.cost <= 4:
+                if not isinstance(card, VictoryCard) and game.card_cost(card) <= 4:
                     with fetch_card_from_supply(game, type(card)) as new_card:
                         player.discard_pile.append(new_card)
                         for info_player in game.participants:
@@ -384,8 +384,7 @@ class Contraband(TreasureCard):
 
     def activate_action(self, game, player):
         player.remaining_deals += 1
-        card_cls = yield SelectCard(game, player.left(game), card_classes=[c for c in game.card_classes.itervalues()
-            if game.supply.get(c.__name__)],
+        card_cls = yield SelectCard(game, player.left(game), card_classes=game.gainable_card_classes(),
             msg=_("Select a card that %(playername)s cannot buy this turn.",  {"playername": player.name}),
             show_supply_count=True)
         player.prosperity_contraband_cards = getattr(player, "prosperity_contraband_cards", []).append(card_cls)
@@ -487,13 +486,12 @@ class Expand(ActionCard):
             return
         cards = yield SelectHandCards(game, player,
                     count_lower=0, count_upper=1,
-                    msg=_("Select a card you want to trash."))
+                    intent=INTENT_TRASH, msg=_("Select a card you want to trash."))
         if cards:
             card = cards[0]
-            card_cls = yield SelectCard(game, player, card_classes=[c for c in
-                game.card_classes.itervalues()
-                if c.cost <= card.cost + 3 and game.supply.get(c.__name__)
-                and c.potioncost == card.potioncost],
+            card_cls = yield SelectCard(game, player,
+                card_classes=game.gainable_card_classes(
+                    max_cost=game.card_cost(card) + 3, potioncost=card.potioncost),
                 msg=_("Select a card that you want to have."), show_supply_count=True)
             card.trash(game, player)
             new_card = game.supply[card_cls.__name__].pop()
@@ -530,7 +528,7 @@ class KingsCourt(ActionCard):
     def activate_action(self, game, player):
         if not [c for c in player.hand if isinstance(c, ActionCard)]:
             return
-        action_cards = (yield SelectActionCard(self, player,
+        action_cards = (yield SelectActionCard(game, player,
             _("Which action card do you want to play on the kings court? (%i actions left)",
                (player.remaining_actions, ))))
         if action_cards:
@@ -565,18 +563,16 @@ class Forge(ActionCard):
         Forge_money = 0
         if player.hand:
             cards = yield SelectHandCards(game, player,
-                    msg=_("Which cards do you want to trash?"))
+                    intent=INTENT_TRASH, msg=_("Which cards do you want to trash?"))
         else:
             return
         # trash cards
         if cards:
             for card in cards:
-                Forge_money += card.cost
+                Forge_money += game.card_cost(card)
                 card.trash(game, player)
-        card_cls = yield SelectCard(game, player, card_classes=[c for c in
-            game.card_classes.itervalues()
-            if c.cost == Forge_money and game.supply.get(c.__name__)
-            and c.potioncost == 0],
+        card_cls = yield SelectCard(game, player,
+            card_classes=game.gainable_card_classes(cost=Forge_money, potioncost=0),
             msg=_("Select a card that you want to have."), show_supply_count=True)
         if card_cls is not None:
             if game.supply[card_cls.__name__]:
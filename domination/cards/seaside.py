@@ -2,7 +2,7 @@ from domination.cards import TreasureCard, VictoryCard, ActionCard, \
      DurationCard, AttackCard, ReactionCard, CardSet, Seaside
 from domination.cards.base import Duchy, Estate, Copper, Curse, Province
 from domination.gameengine import SelectHandCards, Question, MultipleChoice, \
-     InfoRequest, SelectCard, Defended, YesNoQuestion
+     InfoRequest, SelectCard, Defended, YesNoQuestion, INTENT_TRASH
 from domination.tools import _
 from domination.macros.__macros__ import handle_defense, fetch_card_from_supply
 
@@ -176,12 +176,12 @@ class Salvager(ActionCard):
         player.remaining_deals += 1
         if player.hand:
             cards = yield SelectHandCards(game, player, count_lower=1, count_upper=1,
-                    msg=_("Which card do you want to trash?"))
+                    intent=INTENT_TRASH, msg=_("Which card do you want to trash?"))
         else:
             return
         # trash cards
         for card in cards:
-            player.virtual_money += card.cost
+            player.virtual_money += game.card_cost(card)
             card.trash(game, player)
         for info_player in game.following_participants(player):
             yield InfoRequest(game, info_player,
@@ -224,7 +224,7 @@ class Smugglers(ActionCard):
     def activate_action(self, game, player):
         if len(player.right(game).cards_gained) > 1:
             card_classes = [c for c in player.right(game).cards_gained
-                            if c.cost <= 6 and
+                            if game.card_cost(c) <= 6 and
                             game.supply.get(c.__name__)]
             card_cls = yield SelectCard(game, player, card_classes=card_classes,
                 msg=_("Select a card that you want to have."), show_supply_count=True)
@@ -307,7 +307,7 @@ class Embargo(ActionCard):
 
     def activate_action(self, game, player):
         player.virtual_money += 2
-        card_cls = yield SelectCard(game, player, card_classes=[c for c in game.card_classes.values() if game.supply.get(c.__name__)],
+        card_cls = yield SelectCard(game, player, card_classes=game.gainable_card_classes(),
             msg=_("Select a pile to put the Embargo token on."), show_supply_count=True)
         for info_player in game.following_participants(player):
             yield InfoRequest(game, info_player,
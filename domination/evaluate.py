@@ -0,0 +1,115 @@
+import os
+import sys
+import math
+import time
+import optparse
+from random import SystemRandom
+from multiprocessing import cpu_count
+
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_dir)
+
+from domination.simulate import play_games, resolve_kingdom, random_kingdom, \
+        MAX_ROUNDS
+from domination.strategies import get_strategy
+
+
+Z_95 = 1.96
+
+
+def wilson_interval(wins, games, z=Z_95):
+    """ Returns the Wilson score interval (low, high) of the win rate
+    wins / games. """
+    if not games:
+        return 0.0, 1.0
+    p = float(wins) / games
+    denominator = 1 + z * z / games
+    center = (p + z * z / (2 * games)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def make_tasks(strategy_a, strategy_b, kingdoms, pairs, max_rounds, seed):
+    """ Returns the tasks of pairs games for every kingdom, or in a random
+    kingdom each if kingdoms is None. Every game is played twice with the
+    same seed, once with each strategy in the first seat. """
+    tasks = []
+    for card_keys in kingdoms or [None]:
+        for _ in xrange(pairs):
+            if kingdoms is None:
+                card_keys = random_kingdom()
+            game_seed = seed + len(tasks) if seed is not None else \
+                    SystemRandom().getrandbits(64)
+            for kinds in ([strategy_a, strategy_b], [strategy_b, strategy_a]):
+                tasks.append((len(tasks), card_keys, kinds, max_rounds, game_seed))
+    return tasks
+
+
+def evaluate(strategy_a, strategy_b, kingdoms, pairs, processes=None,
+             max_rounds=MAX_ROUNDS, seed=None):
+    """ Plays strategy_a against strategy_b and returns a dict with the
+    numbers of games won, lost and tied by strategy_a and of crashed
+    games. """
+    tasks = make_tasks(strategy_a, strategy_b, kingdoms, pairs, max_rounds, seed)
+    seat_of_a = dict((task[0], task[2].index(strategy_a)) for task in tasks)
+    stats = {"wins": 0, "losses": 0, "ties": 0, "errors": 0}
+    for result in play_games(tasks, processes):
+        if result["error"]:
+            stats["errors"] += 1
+        elif result["winner"] is None:
+            stats["ties"] += 1
+        elif result["players"].index(result["winner"]) == seat_of_a[result["game"]]:
+            stats["wins"] += 1
+        else:
+            stats["losses"] += 1
+    return stats
+
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [options] STRATEGY_A STRATEGY_B",
+            description="Plays two AI strategies against each other and prints"
+            " the win rate of the first one with its 95% confidence interval."
+            " Ties count as half a win.")
+    parser.add_option('-n', '--games', dest='games', action='store', type="int",
+            help='number of games per kingdom', default=200)
+    parser.add_option('-k', '--kingdom', dest='kingdoms', action='append',
+            type="string", help='kingdom to play in, a card set name or a comma'
+            ' separated list of card keys (default: a random kingdom per game pair)',
+            default=[])
+    parser.add_option('-j', '--processes', dest='processes', action='store',
+            type="int", help='number of worker processes', default=cpu_count())
+    parser.add_option('-r', '--max-rounds', dest='max_rounds', action='store',
+            type="int", help='abort games after this many rounds', default=MAX_ROUNDS)
+    parser.add_option('-s', '--seed', dest='seed', action='store',
+            type="int", help='seed of the first game', default=None)
+
+    options, args = parser.parse_args(argv)
+    if len(args) != 2:
+        parser.error("need two strategies")
+    if args[0] == args[1]:
+        parser.error("the strategies need to differ")
+    try:
+        for spec in args:
+            get_strategy(spec)
+        kingdoms = [resolve_kingdom(spec) for spec in options.kingdoms] or None
+    except ValueError, e:
+        parser.error(str(e))
+
+    start = time.time()
+    pairs = max(1, options.games / 2)
+    stats = evaluate(args[0], args[1], kingdoms, pairs, options.processes,
+                     options.max_rounds, options.seed)
+    games = stats["wins"] + stats["losses"] + stats["ties"]
+    print "%s vs %s: %i games in %.1f s" % (args[0], args[1], games,
+            time.time() - start)
+    if stats["errors"]:
+        print "%i games crashed and are not counted" % (stats["errors"], )
+    print "%s won %i, lost %i, tied %i" % (args[0], stats["wins"],
+            stats["losses"], stats["ties"])
+    score = stats["wins"] + stats["ties"] / 2.0
+    low, high = wilson_interval(score, games)
+    print "win rate %.1f%% (95%% confidence interval %.1f%% - %.1f%%)" % (
+            100.0 * score / max(games, 1), 100 * low, 100 * high)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
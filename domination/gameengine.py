@@ -1,17 +1,32 @@
+import os
 import sys
+import time
 import pickle
-from random import SystemRandom
-from threading import Thread, local
+from array import array
+from random import Random, SystemRandom
+from threading import Thread, Lock, local
+from Queue import Queue
 from threading import _Condition as PristineCondition
-from collections import defaultdict
+from collections import defaultdict, deque, namedtuple
 
+from domination import metrics
 from domination.tools import _, taint_filename
+from domination.gamestate import game_state, diff_state, merge_diff
+from domination.journal import Journal, encode_response, decode_response, \
+        RESPONSE, KICK, OPTION
 from domination.macros.__macros__ import generator_forward, generator_forward_ex
 
 
-random = SystemRandom()
 TLS = local()
 
+# number of state diffs a GameRunner keeps for clients that poll the state
+DIFF_HISTORY = 64
+# with a journal, a full snapshot of a game is only taken every this many
+# rounds
+SNAPSHOT_INTERVAL = 10
+# number of info messages kept for every participant of a game
+INFO_QUEUE_SIZE = 100
+
 
 class Condition(PristineCondition):
     def __getstate__(self):
@@ -21,6 +36,123 @@ class Condition(PristineCondition):
         PristineCondition.__init__(self)
 
 
+class SecureRandom(SystemRandom):
+    """ SystemRandom that survives pickling, it has no state to store. """
+    def __reduce__(self):
+        return (SecureRandom, ())
+
+
+class SupplyPile(object):
+    """ A pile of identical cards in the supply. Only the number of cards is
+    stored, a card is instantiated when it leaves the pile. """
+    __slots__ = ("card_class", "count", "index")
+
+    def __init__(self, card_class, count=0):
+        self.card_class = card_class
+        self.count = count
+        self.index = None # the SupplyIndex of the game
+
+    def __reduce__(self):
+        # the index is rebuilt by the game
+        return (SupplyPile, (self.card_class, self.count))
+
+    def __repr__(self):
+        return "<SupplyPile %s: %i>" % (self.card_class.__name__, self.count)
+
+    def __len__(self):
+        return self.count
+
+    def pop(self):
+        if not self.count:
+            raise IndexError("pop from empty supply pile")
+        self.count -= 1
+        if not self.count and self.index is not None:
+            self.index.remove(self.card_class)
+        return self.card_class()
+
+    def append(self, card):
+        assert type(card) is self.card_class
+        self.count += 1
+        if self.count == 1 and self.index is not None:
+            self.index.add(self.card_class)
+
+
+class SupplyIndex(object):
+    """ The card classes of the non-empty supply piles of a game, bucketed
+    by cost and potion cost. The piles and Game.change_cost keep it up to
+    date. """
+    def __init__(self, game):
+        self.game = game
+        self.buckets = {}
+        self.bucket_of = {}
+        for pile in game.supply.itervalues():
+            self.attach(pile)
+
+    def attach(self, pile):
+        pile.index = self
+        if pile.count:
+            self.add(pile.card_class)
+
+    def add(self, card_class):
+        bucket = (self.game.card_cost(card_class), card_class.potioncost)
+        self.bucket_of[card_class.__name__] = bucket
+        self.buckets.setdefault(bucket, {})[card_class.__name__] = card_class
+
+    def remove(self, card_class):
+        bucket = self.bucket_of.pop(card_class.__name__, None)
+        if bucket is not None:
+            del self.buckets[bucket][card_class.__name__]
+
+    def cost_changed(self, key):
+        if key in self.bucket_of:
+            card_class = self.buckets[self.bucket_of[key]][key]
+            self.remove(card_class)
+            self.add(card_class)
+
+    def find(self, cost=None, max_cost=None, potioncost=None, cls=None):
+        """ Returns the card classes sorted by key that cost exactly cost or
+        at most max_cost Money and potioncost Potions and are subclasses of
+        cls. Criteria that are None are ignored. """
+        result = []
+        for (bucket_cost, bucket_potioncost), card_classes in self.buckets.iteritems():
+            if cost is not None and bucket_cost != cost or \
+                    max_cost is not None and bucket_cost > max_cost or \
+                    potioncost is not None and bucket_potioncost != potioncost:
+                continue
+            if cls is None:
+                result.extend(card_classes.itervalues())
+            else:
+                result.extend(c for c in card_classes.itervalues() if issubclass(c, cls))
+        result.sort(key=lambda c: c.__name__)
+        return result
+
+
+def pack_cards(cards):
+    """ Returns a compact representation of the list cards for pickling: a
+    tuple of card keys and an array of indexes into it. Lists containing
+    cards with attributes of their own are returned unchanged. """
+    keys = []
+    indexes = {}
+    packed = array("B")
+    for card in cards:
+        if card.__dict__:
+            return cards
+        index = indexes.get(card.__name__)
+        if index is None:
+            index = indexes[card.__name__] = len(keys)
+            keys.append(card.__name__)
+        packed.append(index)
+    return (tuple(keys), packed)
+
+def unpack_cards(data):
+    """ Reverses pack_cards. """
+    if isinstance(data, list):
+        return data
+    keys, packed = data
+    classes = CardTypeRegistry.keys2classes(keys)
+    return [classes[index]() for index in packed]
+
+
 class EndOfGameException(Exception):
     pass
 
@@ -55,7 +187,7 @@ class Request(object):
     def choose_randomly(self):
         if not self.choices:
             return
-        return random.choice(self.choices)
+        return self.game.random.choice(self.choices)
 
     def choose_wisely(self):
         if not self.choices:
@@ -72,7 +204,10 @@ class MultipleChoicesRequestMixin(object):
     number_of_choices = -1
     def choose_randomly(self):
         assert self.number_of_choices != -1
-        return random.sample(self.choices, self.number_of_choices)
+        count = self.number_of_choices
+        if count is None: # no upper bound, like the wise slice
+            count = len(self.choices)
+        return self.game.random.sample(self.choices, count)
 
 
 class YesNoQuestion(Request):
@@ -97,22 +232,31 @@ class MultipleChoice(MultipleChoicesRequestMixin, Request):
         self.number_of_choices = max_amount
         self.choices = [choice for choice, _ in self.options]
 
+# intents of a SelectHandCards request, i.e. what happens to the selected
+# cards. The AI picks the cards by it.
+INTENT_TRASH = "trash"
+INTENT_PLAY = "play"
+INTENT_DISCARD = "discard"
+INTENTS = [INTENT_TRASH, INTENT_PLAY, INTENT_DISCARD]
+
 class SelectHandCards(MultipleChoicesRequestMixin, Request):
     def __init__(self, game, player, msg, cls=None, count_lower=0, count_upper=None,
-                 not_selectable=(), preselect_all=False):
+                 not_selectable=(), preselect_all=False, intent=None):
         Request.__init__(self, game, player, msg)
         self.cls = cls
         self.count_lower = count_lower
         self.count_upper = count_upper
         self.not_selectable = not_selectable
         self.preselect_all = preselect_all
+        self.intent = intent
+        self._choices = None
 
         count = self.count_lower
         if self.count_upper is not None:
             count = self.count_upper
         if count == 0:
             count = 2 # arbitrary
-        if "trash" in msg:
+        if intent == INTENT_TRASH:
             # chapel
             if (count_upper == 4 and count_lower != 4) or \
                     (count_upper == 1 and count_lower == 0): # masquerade
@@ -123,25 +267,30 @@ class SelectHandCards(MultipleChoicesRequestMixin, Request):
 
     @property
     def choices(self):
-        def key(c):
-            factor = 1
-            functokens = c.activate_action.im_func.func_code.co_names
-            if "trash" in self.msg and c.points == 1 and self.count_upper != 1:
+        # the hand does not change while the request is pending
+        if self._choices is None:
+            self._choices = sorted([c for c in self.player.hand
+                                    if self.is_selectable(c)], key=self.sort_key)
+        return self._choices
+
+    def sort_key(self, c):
+        factor = 1
+        intent = self.intent
+        if intent == INTENT_TRASH:
+            if c.points == 1 and self.count_upper != 1:
                 factor = -50
-            elif "trash" in self.msg and self.count_upper == 1:
+            elif self.count_upper == 1:
                 factor = -1
-            elif "want to play" in self.msg:
-                if "remaining_actions" in functokens:
-                    factor = -4
-                elif "SelectActionCard" in functokens: # throne room
-                    factor = -6
-                else:
-                    factor = -1
-            elif "Militia" in self.msg and isinstance(c, VictoryCard):
-                factor = -10
-            return c.get_cost(self.game, self.player) * factor
-        return sorted([c for c in self.player.hand if self.is_selectable(c)],
-                key=key)
+        elif intent == INTENT_PLAY:
+            if c.features.gives_actions:
+                factor = -4
+            elif c.features.plays_actions:
+                factor = -6
+            else:
+                factor = -1
+        elif intent == INTENT_DISCARD and isinstance(c, VictoryCard):
+            factor = -10
+        return c.get_cost(self.game, self.player) * factor
 
     def is_selectable(self, card):
         if card in self.not_selectable:
@@ -154,7 +303,7 @@ class SelectHandCards(MultipleChoicesRequestMixin, Request):
         return bool([c for c in self.player.hand if self.is_selectable(c)])
 
 def SelectActionCard(game, player, msg):
-    return SelectHandCards(game, player, msg, ActionCard, 0, 1)
+    return SelectHandCards(game, player, msg, ActionCard, 0, 1, intent=INTENT_PLAY)
 
 class SelectDeal(Request):
     wise_slice = 0
@@ -168,7 +317,7 @@ class SelectDeal(Request):
     @property
     def choices(self):
         l = [c for c in self.cards if self.is_buyable(c) and c.points not in (-1, 1) and c.get_worth != 1]
-        random.shuffle(l)
+        self.game.random.shuffle(l)
         # we want to buy the most expensive card but not the same one every time
         l.sort(key=lambda c: c.get_cost(self.game, self.player), reverse=True)
         return [c.__name__ for c in l]
@@ -198,12 +347,75 @@ class InfoRequest(Request):
         Request.__init__(self, game, player, msg)
         self.cards = cards
 
+class InfoEvent(namedtuple("InfoEvent", "seqno msg card_keys")):
+    """ What an InfoQueue keeps of an InfoRequest, it refers to the cards by
+    their keys instead of the game and card objects. """
+    __slots__ = ()
+
+    @property
+    def cards(self):
+        return CardTypeRegistry.keys2classes(self.card_keys)
+
+class InfoQueue(object):
+    """ Keeps the last INFO_QUEUE_SIZE info messages of a participant. The
+    messages are numbered, clients that show the messages up to a seqno only
+    read the newer ones with since. Iterating is safe while the game thread
+    appends. """
+    def __init__(self, size=INFO_QUEUE_SIZE):
+        self.events = deque(maxlen=size)
+        self.seqno = 0 # of the last message
+        self.cleared = 0 # seqno of the last message that was cleared
+
+    def append(self, req):
+        self.seqno += 1
+        self.events.append(InfoEvent(self.seqno, req.msg,
+                                     tuple(card.__name__ for card in req.cards)))
+
+    def clear(self):
+        self.cleared = self.seqno
+        self.events.clear()
+
+    def since(self, seqno, until=None):
+        """ Returns the messages after seqno up to until. """
+        return [event for event in list(self.events) if event.seqno > seqno
+                and (until is None or event.seqno <= until)]
+
+    def __iter__(self):
+        # copying the deque does not release the GIL
+        return iter(list(self.events))
+
+    def __len__(self):
+        return len(self.events)
+
+def upgrade_info_queue(d):
+    """ Converts the info queue in the pickled state d of a participant of a
+    game stored before the info queues were bounded. """
+    if isinstance(d.get("info_queue"), list):
+        info_queue = InfoQueue()
+        for req in d["info_queue"]:
+            info_queue.append(req)
+        d["info_queue"] = info_queue
+
 
 FRESH = "Fresh"
 RUNNING = "Running"
 ENDED = "Ended"
 STATES = [FRESH, RUNNING, ENDED]
 
+# reasons returned by check_end_of_game
+PROVINCES_EMPTY = "provinces"
+COLONIES_EMPTY = "colonies"
+PILES_EMPTY = "piles"
+ROUND_LIMIT = "round limit"
+
+def storage_path(name, postfix):
+    """ Returns the path of the file of the game name with postfix. """
+    from domination.main import app
+    filename = taint_filename(name + postfix)
+    if app.game_storage_path:
+        return os.path.join(app.game_storage_path, filename)
+    return app.game_storage_prefix + filename
+
 class GameRunner(Thread):
     def __init__(self, game, owner, seqno=0, waiting_for=None, state=FRESH):
         Thread.__init__(self)
@@ -214,13 +426,22 @@ class GameRunner(Thread):
         self.owner = owner
         self.state = state
         self.do_cancel = False
-        self.starting_from_checkpoint = seqno != 0
+        self.starting_from_checkpoint = state != FRESH
+        self.last_state = None
+        self.diffs = deque(maxlen=DIFF_HISTORY)
+        self.supply_seqno = seqno # the last seqno that changed the supply
+        self.journal = None
+        self.recording = None # a replay.Recording of the decisions
+        self.pending_request = None
+        self.replay = deque() # journal entries not replayed yet
+        self.journaled = 0 # number of decisions the journal already holds
+        self.request_started = None # (time, request type) if metrics are on
 
     def __getstate__(self):
         return (self.game, self.owner, self.seqno, self.waiting_for, self.state)
 
     def __setstate__(self, args):
-        GameRunner.__init__(self, *args)
+        type(self).__init__(self, *args)
 
     def startable(self, player):
         return self.state is FRESH and player is self.owner and not self.is_alive()\
@@ -238,21 +459,98 @@ class GameRunner(Thread):
             pass
         except:
             self.owner.request_queue.append(DebugRequest(sys.exc_info()))
+        self._end()
+
+    def _end(self):
         self.state = ENDED
         self.waiting_for = None
+        if self.journal is not None:
+            self.journal.close()
+        if self.recording is not None:
+            self.recording.close()
         self.increment_seqno()
 
     def increment_seqno(self):
         self.seqno_condition.acquire()
         self.seqno += 1
+        state = game_state(self)
+        diff = diff_state(self.last_state, state)
+        if "supply" in diff:
+            self.supply_seqno = self.seqno
+        self.diffs.append((self.seqno, diff))
+        self.last_state = state
         self.seqno_condition.notifyAll()
         self.seqno_condition.release()
 
+    def state_since(self, seqno=None):
+        """ Returns a tuple (seqno, full, state). state is the public game
+        state at seqno if full is true, otherwise the diff between the passed
+        seqno and seqno. A full state is returned if the diff is not
+        available anymore. """
+        self.seqno_condition.acquire()
+        try:
+            if self.last_state is None:
+                return self.seqno, True, game_state(self)
+            if seqno is None or seqno > self.seqno or not self.diffs or \
+                    self.diffs[0][0] > seqno + 1:
+                return self.seqno, True, dict(self.last_state)
+            diff = {}
+            for diff_seqno, newer in self.diffs:
+                if diff_seqno > seqno:
+                    merge_diff(diff, newer)
+            return self.seqno, False, diff
+        finally:
+            self.seqno_condition.release()
+
+    def wait_for_seqno(self, seqno, timeout=None):
+        """ Waits until the seqno differs from seqno or timeout seconds
+        passed. Returns the current seqno. """
+        self.seqno_condition.acquire()
+        try:
+            if self.seqno == seqno:
+                if timeout is None:
+                    while self.seqno == seqno:
+                        self.seqno_condition.wait()
+                else:
+                    self.seqno_condition.wait(timeout)
+            return self.seqno
+        finally:
+            self.seqno_condition.release()
+
     def _run(self):
+        gen = self._start_game()
+        reply = None
+        while True:
+            player = self._next_request(gen, reply)
+            if player is None:
+                break
+            player.response_condition.acquire()
+            try:
+                while not player.response and not self.do_cancel:
+                    player.response_condition.wait()
+                reply = self._take_response(player)
+            finally:
+                player.response_condition.release()
+
+    def _start_game(self):
+        from domination.main import app
+        if app.journal_enabled and self.game.seed is not None:
+            self.journal = Journal(self.storage_path(app.game_journal_postfix))
+        if app.replays_enabled and self.game.seed is not None:
+            from domination.replay import Recording
+            self.recording = Recording(self.storage_path(app.game_replay_postfix))
+            if self.starting_from_checkpoint:
+                self.recording.resume(self.game.decisions)
+            else:
+                self.recording.start(self.game)
         if not self.starting_from_checkpoint:
             self.state = RUNNING
-        gen = self.game.play_game(self.starting_from_checkpoint)
-        reply = None
+        return self.game.play_game(self.starting_from_checkpoint)
+
+    def _next_request(self, gen, reply):
+        """ Sends reply to gen and handles the requests that need no answer.
+        Returns the player that has to answer the next request or None if
+        the game is over. """
         while not self.do_cancel:
             try:
                 req = gen.send(reply)
@@ -268,26 +566,112 @@ class GameRunner(Thread):
                 continue
             if isinstance(req, Checkpoint):
                 self.waiting_for = None
-                self.store()
+                self.checkpoint()
                 continue
             req.seqno = self.seqno + 1
+            self.pending_request = req
             player.request_queue.append(req)
             self.waiting_for = player
             player.compute_response() # used for bots
+            self.replay_decision(player)
+            if metrics.enabled and not player.response:
+                self.request_started = (time.time(), type(req).__name__)
             self.increment_seqno()
+            return player
 
-            player.response_condition.acquire()
-            while not player.response and not self.do_cancel:
-                player.response_condition.wait()
-            if not self.do_cancel:
-                reply = player.response[0]
-            player.response = []
+    def _take_response(self, player):
+        """ Returns the reply of player to its request. The response_condition
+        of player has to be held. """
+        reply = None
+        if self.request_started is not None:
+            started, name = self.request_started
+            self.request_started = None
+            metrics.REQUEST_SECONDS.observe(time.time() - started, (name, ))
+        if not self.do_cancel:
+            reply = player.response[0]
+            self.log_decision(player, reply)
+        player.response = []
+        if player.kicked_by:
+            reply = PlayerKickedException(player)
+            for participant in self.game.participants:
+                participant.info_queue.append(InfoRequest(self.game, participant, _("%(kicker)s kicked %(kickee)s.", {"kicker": player.kicked_by.name, "kickee": player.name}), []))
+            player.name += " (kicked)"
+        return reply
+
+    def log_decision(self, player, reply):
+        game = self.game
+        if self.journal is not None or self.recording is not None:
             if player.kicked_by:
-                reply = PlayerKickedException(player)
-                for participant in self.game.participants:
-                    participant.info_queue.append(InfoRequest(self.game, participant, _("%(kicker)s kicked %(kickee)s.", {"kicker": player.kicked_by.name, "kickee": player.name}), []))
-                player.name += " (kicked)"
-            player.response_condition.release()
+                kind, data = KICK, player.kicked_by.name
+            else:
+                kind, data = RESPONSE, encode_response(player, reply)
+            if self.journal is not None and game.decisions >= self.journaled:
+                self.journal.append(kind, game.decisions, player, data)
+                self.journaled = game.decisions + 1
+            if self.recording is not None:
+                self.recording.append(kind, game.decisions, player, data,
+                                      self.pending_request)
+        game.decisions += 1
+
+    def load_journal(self, path):
+        """ Queues the decisions logged in the journal at path since the
+        snapshot the runner was restored from. They are replayed when the game
+        is started. """
+        self.replay.extend(Journal(path).read(self.game.decisions))
+        if self.replay:
+            self.journaled = self.replay[-1][1] + 1
+
+    def replay_decision(self, player):
+        """ Answers the pending request of player from the journal. Bots
+        compute their answer anyway to draw the same random numbers, but
+        take the logged one, some strategies like mcts are not deterministic. """
+        game = self.game
+        while self.replay and self.replay[0][1] <= game.decisions:
+            kind, decision, name, data = self.replay.popleft()
+            if kind == OPTION:
+                for participant in game.players:
+                    if participant.name == name:
+                        participant.options[data[0]] = data[1]
+                continue
+            if decision < game.decisions or name != player.name:
+                self.replay.clear()
+                raise ValueError("The journal does not match the game")
+            if kind == KICK:
+                kicker = [p for p in game.participants if p.name == data]
+                game.kick(kicker[0] if kicker else Kibitzer(data), player)
+            elif player.response:
+                player.response[:] = [decode_response(player, data)]
+            else:
+                player.request_queue.pop(0)
+                player.response.append(decode_response(player, data))
+            return
+
+    def set_option(self, player, key, value):
+        player.options[key] = value
+        if self.journal is not None:
+            self.journal.append(OPTION, self.game.decisions, player, [key, value])
+        if self.recording is not None:
+            self.recording.append(OPTION, self.game.decisions, player, [key, value])
+
+    def deliver_response(self, player, response):
+        """ Answers the first request in the request queue of player. """
+        cv = player.response_condition
+        cv.acquire()
+        try:
+            player.request_queue.pop(0)
+            player.response.append(response)
+            cv.notify()
+        finally:
+            cv.release()
+        self.wake()
+
+    def kick(self, kicker, kickee):
+        self.game.kick(kicker, kickee)
+        self.wake()
+
+    def wake(self):
+        """ Called after a response was delivered to one of the players. """
+        pass
 
     def cancel(self):
         self.do_cancel = True
@@ -304,26 +688,151 @@ class GameRunner(Thread):
             cv.acquire()
             cv.notifyAll()
             cv.release()
+        self.wake()
+
+    def checkpoint(self):
+        """ Called at the start of every round. Without a journal, the game
+        is stored every time. """
+        if self.journal is None:
+            self.store()
+        elif not self.replay and self.game.round % SNAPSHOT_INTERVAL == 0:
+            self.store()
+            self.journal.truncate()
+
+    def storage_path(self, postfix):
+        return storage_path(self.game.name, postfix)
 
     def store(self):
         from domination.main import app
-        path = app.game_storage_prefix + taint_filename(self.game.name
-            + app.game_storage_postfix)
-        if app.game_storage_path:
-            path = os.path.join(app.game_storage_path, taint_filename(self.game.name
-            + app.game_storage_postfix))
-        f = file(path, "wb")
+        path = self.storage_path(app.game_storage_postfix)
+        # a crash while writing must not destroy the previous snapshot
+        started = time.time()
+        f = file(path + ".tmp", "wb")
         pickle.dump(self, f)#, -1)
+        size = f.tell()
         f.close()
+        os.rename(path + ".tmp", path)
+        metrics.STORE_SECONDS.observe(time.time() - started)
+        metrics.STORE_BYTES.observe(size)
+
+
+class Scheduler(Thread):
+    """ Drives the games of all ScheduledGameRunners in a single thread. A
+    runner is queued whenever one of its players answered. """
+    def __init__(self):
+        Thread.__init__(self, name="Scheduler")
+        self.daemon = True
+        self.queue = Queue()
+        self.start_lock = Lock()
+
+    def schedule(self, runner):
+        if not self.is_alive():
+            with self.start_lock:
+                if not self.is_alive():
+                    self.start()
+        self.queue.put(runner)
+
+    def run(self):
+        while True:
+            self.queue.get().step()
+
+scheduler = Scheduler()
+
+
+class ScheduledGameRunner(GameRunner):
+    """ A GameRunner without a thread of its own. Its game is advanced by
+    the scheduler until the game waits for a player, so waiting for humans
+    costs no thread. """
+    def __init__(self, *args, **kwargs):
+        GameRunner.__init__(self, *args, **kwargs)
+        self.alive = False
+        self.gen = None
+        self.responder = None
+
+    def start(self):
+        self.alive = True
+        scheduler.schedule(self)
+
+    def is_alive(self):
+        return self.alive
+
+    def wake(self):
+        if self.alive:
+            scheduler.schedule(self)
+
+    def step(self):
+        """ Advances the game until it waits for a player that did not
+        answer yet. Superfluous calls do nothing. """
+        if not self.alive:
+            return
+        TLS.game = self.game
+        try:
+            if self.gen is None:
+                self.gen = self._start_game()
+                player = self._next_request(self.gen, None)
+            else:
+                player = self.responder
+            while player is not None:
+                player.response_condition.acquire()
+                try:
+                    if not player.response and not self.do_cancel:
+                        self.responder = player
+                        return
+                    reply = self._take_response(player)
+                finally:
+                    player.response_condition.release()
+                player = self._next_request(self.gen, reply)
+        except EndOfGameException:
+            pass
+        except:
+            self.owner.request_queue.append(DebugRequest(sys.exc_info()))
+        self.alive = False
+        self.gen = self.responder = None
+        self._end()
+
 
 from domination.cards import DurationCard, Card
 
+def clone_value(value, memo):
+    """ Copies the lists, dicts and supply piles in value and the cards that
+    have a state, see Game.clone. memo maps the ids of the copied objects
+    to their copies. """
+    try:
+        return memo[id(value)]
+    except KeyError:
+        pass
+    cls = type(value)
+    if cls is list:
+        return [clone_value(item, memo) for item in value]
+    if cls is dict:
+        return dict((key, clone_value(item, memo)) for key, item in value.iteritems())
+    if cls is SupplyPile:
+        return SupplyPile(value.card_class, value.count)
+    if isinstance(value, Card) and getattr(value, "__dict__", None):
+        copy = memo[id(value)] = object.__new__(cls)
+        copy.__dict__.update(value.__dict__)
+        return copy
+    return value
+
+
 class Game(object):
+    # attributes that Game.clone does not copy
+    SHARED_ATTRS = ("card_classes", "selected_cards", "player_options",
+                    "player_option_defaults")
     HOOKS = ["on_pre_buy_card", "on_end_of_game", "on_start_of_turn", "on_end_of_turn", "on_buy_card", "on_render_card_info",
             "on_gain_card", "on_setup_card", "on_render_piles"]
 
-    def __init__(self, name, selected_cards):
+    def __init__(self, name, selected_cards, seed=None, secure_random=False):
         from domination.cards import CardTypeRegistry
+        if secure_random:
+            # unpredictable but not reproducible, for live games
+            self.seed = None
+            self.random = SecureRandom()
+        else:
+            if seed is None:
+                seed = SecureRandom().getrandbits(64)
+            self.seed = seed
+            self.random = Random(seed)
         self.selected_cards = selected_cards
         self.players = []
         self.pending_round_players = None
@@ -336,21 +845,92 @@ class Game(object):
         self.name = name
         self.card_classes = CardTypeRegistry.raw_card_classes
         self.cost_delta = {}
+        self.cost_table = {} # cache of the costs including cost_delta
+        self.cost_version = 0
+        self._supply_index = None
         self.cards_to_draw = 5
         self._hooks = {}
         self.prepare_hooks(selected_cards)
         self.player_options = {}
         self.player_option_defaults = {}
+        self.decisions = 0 # number of requests answered so far
+        self.profile = None # a profiler.Profile to time the card effects
 
     def __hash__(self):
         return hash(self.name)
 
+    def clone(self, random=None):
+        """ Returns a copy of the game to look ahead in, e.g. for AI players.
+        Cards without state of their own are shared with the copy, so this
+        is much cheaper than pickling. Requests, kibitzers and the turn
+        cleanups of the players are not copied. The copy shuffles with
+        random, a new unseeded generator by default. """
+        memo = {}
+        game = memo[id(self)] = object.__new__(type(self))
+        random = random or Random()
+        for player in self.players:
+            memo[id(player)] = object.__new__(type(player))
+        for player in self.players:
+            d = dict((key, clone_value(value, memo))
+                     for key, value in player.__dict__.iteritems())
+            d.update(random=random, request_queue=[], info_queue=InfoQueue(), response=[],
+                     response_condition=Condition(), turn_cleanups=[])
+            memo[id(player)].__dict__.update(d)
+        d = dict((key, value if key in self.SHARED_ATTRS else clone_value(value, memo))
+                 for key, value in self.__dict__.iteritems())
+        d.update(random=random, kibitzers=[], _supply_index=None, profile=None)
+        game.__dict__.update(d)
+        return game
+
     def __getstate__(self):
         d = self.__dict__.copy()
         if d.get("_hooks", None) is not None:
             del d['_hooks']
+        d["trash_pile"] = pack_cards(d["trash_pile"])
+        d.pop("cost_table", None)
+        d.pop("_supply_index", None)
         return d
 
+    def __setstate__(self, d):
+        d["trash_pile"] = unpack_cards(d["trash_pile"])
+        d["cost_table"] = {}
+        d.setdefault("cost_version", 0)
+        d.setdefault("decisions", 0)
+        d.setdefault("profile", None)
+        d["_supply_index"] = None
+        self.__dict__.update(d)
+
+    def card_cost(self, card):
+        """ Returns the cost in Money of card (a card or card class) including
+        the changes of the current turn. """
+        key = card.__name__
+        try:
+            return self.cost_table[key]
+        except KeyError:
+            cost = self.cost_table[key] = card.raw_cost + self.cost_delta.get(key, 0)
+            return cost
+
+    def change_cost(self, card, delta):
+        """ Changes the cost of card (a card or card class) by delta Money. """
+        key = card.__name__
+        self.cost_delta[key] = self.cost_delta.get(key, 0) + delta
+        self.cost_table.pop(key, None)
+        self.cost_version += 1
+        if self._supply_index is not None:
+            self._supply_index.cost_changed(key)
+
+    @property
+    def supply_index(self):
+        if self._supply_index is None:
+            self._supply_index = SupplyIndex(self)
+        return self._supply_index
+
+    def gainable_card_classes(self, cost=None, max_cost=None, potioncost=None,
+                              cls=None):
+        """ Returns the classes of the cards that are left in the supply,
+        see SupplyIndex.find for the criteria. """
+        return self.supply_index.find(cost, max_cost, potioncost, cls)
+
     @property
     def hooks(self):
         if not hasattr(self, "_hooks"):
@@ -367,7 +947,10 @@ class Game(object):
 
     def fire_hook(self, hook_name, *args):
         for hook in self.hooks[hook_name]:
-            hookgen = hook(*args)
+            if self.profile is None:
+                hookgen = hook(*args)
+            else:
+                hookgen = self.profile.call(hook_name, hook.__self__, hook, *args)
             generator_forward(hookgen)
 
     @property
@@ -375,12 +958,23 @@ class Game(object):
         return self.players + self.kibitzers
 
     def add_supply(self, cls, no):
-        self.supply.setdefault(cls.__name__, []).extend(cls() for _ in xrange(no))
+        pile = self.supply.get(cls.__name__)
+        if pile is None:
+            pile = self.supply[cls.__name__] = SupplyPile(cls)
+        if self._supply_index is not None:
+            self._supply_index.remove(cls)
+        pile.count += no
+        if self._supply_index is not None:
+            self._supply_index.attach(pile)
 
     def play_action_card(self, player, card):
         player.activated_cards.append(card)
         try:
-            gen = card.activate_action(self, player)
+            if self.profile is None:
+                gen = card.activate_action(self, player)
+            else:
+                gen = self.profile.call("play", type(card), card.activate_action,
+                                        self, player)
         except NotImplementedError:
             return
         for other_player in self.participants:
@@ -403,10 +997,13 @@ class Game(object):
             cv.release()
         del self.players[self.players.index(kickee)]
 
-    def play_round(self):
+    def play_round(self, players=None):
+        """ Plays a round, or only the turns of players if passed. """
         from domination.cards import TreasureCard
 
-        self.pending_round_players = players = self.players[:]
+        if players is None:
+            players = self.players[:]
+        self.pending_round_players = players
         while players:
             player = players.pop(0)
             self.finished_round_players.append(player)
@@ -416,7 +1013,11 @@ class Game(object):
                     for card in player.duration_cards:
                         duration_func = card.duration_action
                         card.durationaction_activated = False
-                        gen = duration_func(self, player)
+                        if self.profile is None:
+                            gen = duration_func(self, player)
+                        else:
+                            gen = self.profile.call("duration", type(card),
+                                                    duration_func, self, player)
                         generator_forward(gen)
                     player.aux_cards.extend(player.duration_cards)
                     if player.duration_cards:
@@ -449,7 +1050,7 @@ class Game(object):
                     # select money cards
                     if not player.options["automatic_money_selection"]:
                         cards = (yield SelectHandCards(self, player, _("Which money cards do you want to play?"), TreasureCard,
-                            preselect_all=True))
+                            preselect_all=True, intent=INTENT_PLAY))
                         if cards is None:
                             cards = []
                     else:
@@ -501,21 +1102,36 @@ class Game(object):
                         generator_forward(gen)
 
                 # cleanup pt. 2
-                for card in player.aux_cards:
-                    if card.durationaction_activated:
-                        player.duration_cards.append(card)
-                    else:
-                        player.discard_pile.append(card)
-                player.aux_cards = []
-                player.discard_pile.extend(player.hand)
-                player.hand = []
-                player.prepare_hand(cards_to_draw)
+                self.discard_turn(player, cards_to_draw)
                 gen = self.fire_hook("on_end_of_turn", self, player)
                 generator_forward(gen)
         self.finished_round_players[:] = []
 
+    def discard_turn(self, player, cards_to_draw):
+        """ Discards the cards of the turn of player, except for duration
+        cards, and draws the next hand. """
+        for card in player.aux_cards:
+            if card.durationaction_activated:
+                player.duration_cards.append(card)
+            else:
+                player.discard_pile.append(card)
+        player.aux_cards = []
+        player.discard_pile.extend(player.hand)
+        player.hand = []
+        player.prepare_hand(cards_to_draw)
+
+    def play_rest_of_game(self, players):
+        """ Plays the turns of players that are left in the current round and
+        the following rounds. For clones taken in the middle of a round. """
+        gen = self.play_round(players)
+        generator_forward_ex(gen, [PlayerKickedException])
+        gen = self.play_game(True)
+        generator_forward(gen)
+
     def play_game(self, starting_from_checkpoint):
         if not starting_from_checkpoint:
+            for player in self.players:
+                player.random = self.random
             self.deal_cards()
             gen = self.fire_hook("on_setup_card", self)
             generator_forward(gen)
@@ -639,9 +1255,10 @@ class DominationGame(Game):
         curse_cards = (no_players - 1) * 10
 
         if any([c.potioncost + (c.__name__ == "BlackMarket") for c in selected_cards]):
-            game.add_supply(Potion, 16)
+            game.add_supply(CardTypeRegistry.keys2classes(("Potion", ))[0], 16)
 
         if any([c.edition == Prosperity for c in selected_cards]):
+            Platinum, Colony = CardTypeRegistry.keys2classes(("Platinum", "Colony"))
             if no_players == 2:
                 game.add_supply(Platinum, 8)
                 game.add_supply(Colony, 8)
@@ -663,7 +1280,7 @@ class DominationGame(Game):
         # add kingdom cards
         for selected_card in selected_cards:
             amount = 10
-            if selected_card in (Gardens, Vineyard): # modify for additional victory cards
+            if selected_card.__name__ in ("Gardens", "Vineyard"): # modify for additional victory cards
                 amount = victory_cards
             game.add_supply(selected_card, amount)
 
@@ -672,15 +1289,15 @@ class DominationGame(Game):
             assert not player.deck # ...does not have a deck...
             player.deck.extend(Copper() for _ in xrange(7)) # ...gets 7 Copper
             player.deck.extend(Estate() for _ in xrange(3)) # ...and 3 Estates.
-            random.shuffle(player.deck) # then his deck is shuffled
+            game.random.shuffle(player.deck) # then his deck is shuffled
 
     def check_end_of_game(self):
         no_players = len(self.players) # number of players
         if not self.supply["Province"]: # check if Province supply is empty
-            return True
+            return PROVINCES_EMPTY
         if "Colony" in self.supply: # check if there is a Colony supply
             if not self.supply["Colony"]: # check if Colony supply is empty
-                return True
+                return COLONIES_EMPTY
         # fill empty_batches with card keys of cards the supply of which is empty
         empty_batches = [card_key for card_key, cards in self.supply.items()
                 if not cards]
@@ -689,7 +1306,7 @@ class DominationGame(Game):
         else:
             must_empty = 4
         if len(empty_batches) >= must_empty:
-            return True
+            return PILES_EMPTY
 
 
 class Kibitzer(object):
@@ -697,13 +1314,20 @@ class Kibitzer(object):
         self.name = name
         self.last_seqno = -1
 
-        self.info_queue = []
+        self.info_queue = InfoQueue()
         self.response_condition = Condition()
         self.response = []
 
+    def __setstate__(self, d):
+        upgrade_info_queue(d)
+        self.__dict__.update(d)
+
 
 class Player(object):
     is_ai = False
+    # piles that are pickled with pack_cards, no other object refers to
+    # the cards in them
+    PACKED_PILES = ("deck", "discard_pile")
     def __init__(self, name):
         self.name = name
         self.discard_pile = []
@@ -723,15 +1347,28 @@ class Player(object):
         self.duration_cards = [] # duration_cards from seaside
         self.options = {}
         self.activated_treasure_cards = None
+        self.random = None # the random generator of the game
 
         self.request_queue = []
-        self.info_queue = []
+        self.info_queue = InfoQueue()
         self.response_condition = Condition()
         self.response = []
 
     def __hash__(self):
         return hash(self.name)
 
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        for attr in self.PACKED_PILES:
+            d[attr] = pack_cards(d[attr])
+        return d
+
+    def __setstate__(self, d):
+        for attr in self.PACKED_PILES:
+            d[attr] = unpack_cards(d[attr])
+        upgrade_info_queue(d)
+        self.__dict__.update(d)
+
     def __enter__(self):
         self.remaining_actions = 1
         self.remaining_deals = 1
@@ -789,7 +1426,7 @@ class Player(object):
         for _ in xrange(count):
             if not self.deck:
                 self.deck, self.discard_pile = self.discard_pile, self.deck
-                random.shuffle(self.deck)
+                self.random.shuffle(self.deck)
                 shuffled = True
             if self.deck:
                 choice = self.deck.pop()
@@ -810,11 +1447,28 @@ class Player(object):
 
 class AIPlayer(Player):
     is_ai = True
+    strategy = None # see domination.strategies, None answers wisely
+    def __init__(self, name, strategy=None):
+        Player.__init__(self, name)
+        self.strategy = strategy
+
     def compute_response(self):
         req = self.request_queue.pop(0)
-        response = req.choose_wisely()
+        if self.strategy is None:
+            response = req.choose_wisely()
+        else:
+            response = self.strategy.respond(req)
         self.response.append(response)
-        self.info_queue = []
+        self.info_queue.clear()
+
+    def redraw(self, req):
+        """ Draws the random numbers from the game that compute_response
+        would draw for req, used when the response is known, e.g. in a
+        replay. """
+        if self.strategy is None:
+            req.choose_wisely()
+        else:
+            self.strategy.redraw(req)
 
 
 # import necessary objects from cards here because of circular importing
@@ -823,15 +1477,4 @@ from domination.cards import editions
 from domination.cards import CardTypeRegistry, ActionCard, VictoryCard
 from domination.cards.base import (Copper, Silver, Gold, Curse,
                                    Estate, Duchy, Province, Gardens)
-from domination.cards.alchemy import Potion, Vineyard
-from domination.cards.prosperity import Platinum, Colony
-
-from domination.cards.base import card_sets as card_sets_base
-from domination.cards.intrigue import card_sets as card_sets_intrigue
-from domination.cards.alchemy import card_sets as card_sets_alchemy
-from domination.cards.seaside import card_sets as card_sets_seaside
-from domination.cards.prosperity import card_sets as card_sets_prosperity
-from domination.cards.cornucopia import card_sets as card_sets_cornucopia
-from domination.cards.hinterlands import card_sets as card_sets_hinterlands
-
-card_sets = card_sets_base + card_sets_intrigue + card_sets_alchemy + card_sets_seaside + card_sets_prosperity + card_sets_cornucopia + card_sets_hinterlands
+# the other editions are imported when a game uses them, see cards/manifest.py
@@ -0,0 +1,100 @@
+""" Plain data snapshots of a running game. Clients that already show a
+game only need the parts of a snapshot that changed since they rendered
+it, see diff_state. """
+
+# bump if the layout of the serialized state changes incompatibly
+API_VERSION = 1
+
+
+def game_state(runner):
+    """ Returns the public state of the game of runner, i.e. everything every
+    participant may see. """
+    game = runner.game
+    return {
+        "seqno": runner.seqno,
+        "state": runner.state,
+        "round": game.round,
+        "players": [[p.name, len(p.hand), len(p.total_cards), bool(p.current),
+                     runner.waiting_for is p] for p in game.players],
+        "kibitzers": [k.name for k in game.kibitzers],
+        "supply": dict((key, len(cards)) for key, cards in game.supply.iteritems()),
+    }
+
+def player_state(player):
+    """ Returns the private state of player, i.e. what only this player may
+    see. Kibitzers only have an info queue. """
+    info_queue = player.info_queue
+    state = {"info": info_queue.seqno, "info_cleared": info_queue.cleared}
+    if hasattr(player, "hand"):
+        req = player.request_queue[0] if player.request_queue else None
+        state.update({
+            "hand": sorted(c.__name__ for c in player.hand),
+            "deck": len(player.deck),
+            "discard_pile": len(player.discard_pile),
+            "request": hash(req) if req is not None else None,
+        })
+    return state
+
+def diff_state(old, new):
+    """ Returns the keys of new whose values differ from old. Nested dicts
+    are compared key by key, so only the changed entries are returned. """
+    if old is None:
+        return dict(new)
+    diff = {}
+    for key, value in new.iteritems():
+        old_value = old.get(key)
+        if old_value == value:
+            continue
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            value = dict((k, v) for k, v in value.iteritems()
+                         if old_value.get(k) != v)
+        diff[key] = value
+    return diff
+
+def merge_diff(diff, newer):
+    """ Folds the diff newer into diff, which has to be a diff of an earlier
+    state. """
+    for key, value in newer.iteritems():
+        if isinstance(value, dict) and isinstance(diff.get(key), dict):
+            merged = dict(diff[key])
+            merged.update(value)
+            value = merged
+        diff[key] = value
+    return diff
+
+def request_state(req):
+    """ Serializes the pending request req with everything a client needs to
+    answer it. """
+    state = {"id": hash(req), "type": type(req).__name__, "msg": unicode(req.msg),
+             "error": unicode(req.last_error)}
+    if state["type"] == "SelectDeal":
+        state["money"] = req.money
+        state["potion"] = req.potion
+        state["cards"] = [[c.__name__, bool(req.is_buyable(c))] for c in req.cards]
+    elif state["type"] == "SelectCard":
+        state["cards"] = [c.__name__ for c in req.card_classes]
+    elif state["type"] == "SelectHandCards":
+        state["count_lower"] = req.count_lower
+        state["count_upper"] = req.count_upper
+        state["selectable"] = [i for i, c in enumerate(req.player.sorted_hand)
+                               if req.is_selectable(c)]
+    elif state["type"] in ("Question", "MultipleChoice"):
+        state["options"] = [[value, unicode(label)] for value, label in req.options]
+    return state
+
+def viewer_state(player, info_since=0):
+    """ Serializes everything the viewer player may see in full: the hand,
+    the info messages after the info seqno info_since and the pending
+    request. """
+    state = {"info": [[unicode(event.msg), list(event.card_keys)]
+                      for event in player.info_queue.since(info_since)],
+             "info_seqno": player.info_queue.seqno}
+    if hasattr(player, "hand"):
+        state.update({
+            "hand": [c.__name__ for c in player.sorted_hand],
+            "deck": len(player.deck),
+            "discard_pile": len(player.discard_pile),
+            "request": request_state(player.request_queue[0])
+                       if player.request_queue else None,
+        })
+    return state
@@ -1,47 +1,198 @@
 # Copyright James Gardner, License GFDL 1.2
 
+import os
+import sys
+import zlib
 import gzip
-import StringIO
+import mimetypes
+from datetime import datetime
+
+from werkzeug.http import http_date, is_resource_modified
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+
+# content types that do not get smaller by compressing them again
+COMPRESSED_TYPES = ("image/", "audio/", "video/", "application/zip",
+                    "application/gzip", "application/x-gzip", "font/woff")
+# static files that compress_static precompresses
+STATIC_EXTENSIONS = (".js", ".css", ".html", ".svg", ".json", ".txt")
+# responses smaller than this are sent uncompressed
+MIN_SIZE = 256
+# wbits for zlib that write a gzip header and trailer
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
 
 class GzipMiddleware(object):
-    def __init__(self, app, compresslevel=9):
+    """ Compresses responses while they are sent. Responses of skip_paths
+    (e.g. long polls and event streams), of compressed content types and
+    tiny ones are sent as they are. If static_dir is given, requests for
+    files below static_url are answered with the .gz file next to them if
+    there is an up to date one, see compress_static. """
+    def __init__(self, app, compresslevel=6, skip_paths=(), static_dir=None,
+                 static_url="/static/", static_max_age=12 * 60 * 60):
         self.app = app
         self.compresslevel = compresslevel
+        self.skip_paths = tuple(skip_paths)
+        self.static_dir = static_dir
+        self.static_url = static_url
+        self.static_max_age = static_max_age
 
     def __call__(self, environ, start_response):
         if 'gzip' not in environ.get('HTTP_ACCEPT_ENCODING', ''):
             return self.app(environ, start_response)
-        if environ['PATH_INFO'][-3:] == '.js':
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(self.skip_paths):
+            return self.app(environ, start_response)
+        # event streams never end, so they cannot be buffered
+        if 'text/event-stream' in environ.get('HTTP_ACCEPT', ''):
             return self.app(environ, start_response)
-        buffer = StringIO.StringIO()
-        output = gzip.GzipFile(
-            mode='wb',
-            compresslevel=self.compresslevel,
-            fileobj=buffer
-        )
-
-        start_response_args = []
-        def dummy_start_response(status, headers, exc_info=None):
-            start_response_args.append(status)
-            start_response_args.append(headers)
-            start_response_args.append(exc_info)
-            return output.write
-
-        app_iter = self.app(environ, dummy_start_response)
-        for line in app_iter:
-            output.write(line)
-        if hasattr(app_iter, 'close'):
-            app_iter.close()
-        output.close()
-        buffer.seek(0)
-        result = buffer.getvalue()
-        headers = []
-        for name, value in start_response_args[1]:
-            if name.lower() != 'content-length':
-                 headers.append((name, value))
-        headers.append(('Content-Length', str(len(result))))
+        if self.static_dir is not None and path.startswith(self.static_url):
+            filename = safe_join(self.static_dir, path[len(self.static_url):])
+            if filename is not None and is_up_to_date(filename):
+                return self.serve_compressed_file(environ, start_response, filename)
+
+        response = []
+        written = []
+        def deferred_start_response(status, headers, exc_info=None):
+            response[:] = [status, headers, exc_info]
+            # the data passed to the write callable is kept until the
+            # response is sent
+            return written.append
+
+        app_iter = self.app(environ, deferred_start_response)
+        rest = with_written(app_iter, written)
+        first = []
+        if not response:
+            # the application starts the response when it is iterated
+            for chunk in rest:
+                first.append(chunk)
+                if response:
+                    break
+        app_iter = ClosingIterator(first, rest, app_iter)
+        status, headers, exc_info = response
+        if not self.should_compress(environ, status, headers):
+            start_response(status, headers, exc_info)
+            return app_iter
+        headers = [(name, value) for name, value in headers
+                   if name.lower() != 'content-length']
         headers.append(('Content-Encoding', 'gzip'))
-        start_response(start_response_args[0], headers, start_response_args[2])
-        buffer.close()
-        return [result]
+        headers.append(('Vary', 'Accept-Encoding'))
+        start_response(status, headers, exc_info)
+        return self.compress(app_iter)
+
+    def should_compress(self, environ, status, headers):
+        if environ.get('REQUEST_METHOD') == 'HEAD' or status[:3] in ('204', '304'):
+            return False
+        headers = dict((name.lower(), value) for name, value in headers)
+        if 'content-encoding' in headers:
+            return False
+        if headers.get('content-type', '').startswith(COMPRESSED_TYPES):
+            return False
+        length = headers.get('content-length')
+        return length is None or int(length) >= MIN_SIZE
+
+    def compress(self, app_iter):
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED,
+                                      GZIP_WBITS)
+        try:
+            for chunk in app_iter:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    def serve_compressed_file(self, environ, start_response, filename):
+        compressed = filename + '.gz'
+        stat = os.stat(compressed)
+        mtime = int(stat.st_mtime)
+        etag = '"gz-%x-%x"' % (mtime, stat.st_size)
+        headers = [('ETag', etag),
+                   ('Last-Modified', http_date(mtime)),
+                   ('Cache-Control', 'public, max-age=%i' % (self.static_max_age, )),
+                   ('Vary', 'Accept-Encoding')]
+        if not is_resource_modified(environ, etag=etag,
+                                    last_modified=datetime.utcfromtimestamp(mtime)):
+            start_response('304 Not Modified', headers)
+            return []
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        if mimetype.startswith('text/') or mimetype == 'application/javascript':
+            mimetype += '; charset=utf-8'
+        headers += [('Content-Type', mimetype),
+                    ('Content-Encoding', 'gzip'),
+                    ('Content-Length', str(stat.st_size))]
+        start_response('200 OK', headers)
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return []
+        return wrap_file(environ, file(compressed, 'rb'))
+
+
+class ClosingIterator(object):
+    """ Yields the items of first and then those of rest, the remainder of
+    app_iter, whose close method is called at the end. """
+    def __init__(self, first, rest, app_iter):
+        self.first = first
+        self.rest = rest
+        self.app_iter = app_iter
+
+    def __iter__(self):
+        for chunk in self.first:
+            yield chunk
+        for chunk in self.rest:
+            yield chunk
+
+    def close(self):
+        if hasattr(self.app_iter, 'close'):
+            self.app_iter.close()
+
+
+def with_written(app_iter, written):
+    """ Yields the items of app_iter, each one after the data that was
+    passed to the write callable before it. """
+    for chunk in app_iter:
+        while written:
+            yield written.pop(0)
+        yield chunk
+    while written:
+        yield written.pop(0)
+
+def is_up_to_date(filename):
+    """ Returns whether the .gz file of filename exists and is not older
+    than filename. """
+    try:
+        return os.stat(filename + '.gz').st_mtime >= os.stat(filename).st_mtime
+    except OSError:
+        return False
+
+def compress_static(directory, compresslevel=9):
+    """ Writes a .gz file next to every static file below directory that has
+    no up to date one. Returns the number of written files. """
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(directory):
+        for name in filenames:
+            filename = os.path.join(dirpath, name)
+            if not name.endswith(STATIC_EXTENSIONS) or is_up_to_date(filename):
+                continue
+            source = file(filename, 'rb')
+            try:
+                data = source.read()
+            finally:
+                source.close()
+            # several servers may start at the same time
+            tmp_name = '%s.gz.%i.tmp' % (filename, os.getpid())
+            # mtime=0 keeps the output the same for the same input
+            output = gzip.GzipFile(tmp_name, 'wb', compresslevel, mtime=0)
+            try:
+                output.write(data)
+            finally:
+                output.close()
+            os.rename(tmp_name, filename + '.gz')
+            count += 1
+    return count
 
+if __name__ == '__main__':
+    for directory in sys.argv[1:]:
+        print "%s: compressed %i files" % (directory, compress_static(directory))
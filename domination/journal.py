@@ -0,0 +1,86 @@
+""" Write-ahead log of the decisions taken in a game. Games are seeded, so
+a game is restored by loading its last snapshot and replaying the decisions
+logged since then through play_game. A logged decision takes a few bytes
+instead of a pickle of the whole game. """
+
+import os
+import json
+
+
+# kinds of journal entries
+RESPONSE = "r"
+KICK = "k"
+OPTION = "o"
+
+
+def encode_response(player, response):
+    """ Turns the response of player into plain data. Card classes are stored
+    by key, cards by their index in the hand of player. """
+    from domination.cards import Card
+    if isinstance(response, type) and issubclass(response, Card):
+        return {"card": response.__name__}
+    if isinstance(response, list) and response and isinstance(response[0], Card):
+        return {"hand": [index_of(player.hand, card) for card in response]}
+    return response
+
+def decode_response(player, data):
+    """ Reverses encode_response. """
+    from domination.cards import CardTypeRegistry
+    if isinstance(data, dict):
+        if "card" in data:
+            return CardTypeRegistry.keys2classes((str(data["card"]), ))[0]
+        return [player.hand[i] for i in data["hand"]]
+    return data
+
+def index_of(cards, card):
+    for i, other in enumerate(cards):
+        if other is card:
+            return i
+    raise ValueError("%r is not in the hand" % (card, ))
+
+
+class Journal(object):
+    """ An append-only file of entries [kind, decision, player name, data],
+    one JSON list per line. decision is the number of decisions taken in the
+    game before the entry. """
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def append(self, kind, decision, player, data):
+        self.write([kind, decision, player.name, data])
+
+    def write(self, data):
+        if self.file is None:
+            self.file = file(self.path, "ab")
+        self.file.write(json.dumps(data, separators=(",", ":")) + "\n")
+        self.file.flush()
+
+    def truncate(self):
+        """ Drops all entries, called after a snapshot was taken. """
+        self.close()
+        self.file = file(self.path, "wb")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def read(self, since=0):
+        """ Returns the entries of the decisions from number since on. A
+        partially written last line is ignored. """
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+        f = file(self.path, "rb")
+        try:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if entry[1] >= since:
+                    entries.append(entry)
+        finally:
+            f.close()
+        return entries
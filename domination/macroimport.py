@@ -0,0 +1,143 @@
+""" Import hook that expands the macros of karnickel. The hook of karnickel
+parses and compiles every module that is imported from source, this one only
+handles the modules that import macros and stores their expanded code in a
+__macrocache__ directory next to them. The cached code is reused as long as
+the module, the macro modules and the Python version stay the same. """
+
+import os
+import re
+import imp
+import ast
+import sys
+import marshal
+from hashlib import sha1
+
+import karnickel
+
+
+CACHE_DIR = "__macrocache__"
+# change it to ignore the cached code, e.g. after changing the expansion
+CACHE_VERSION = "1"
+MACRO_IMPORT = re.compile(r"^\s*from\s+([\w.]+)\.__macros__\s+import\b", re.M)
+
+
+class MacroImporter(karnickel.MacroImporter):
+    def __init__(self, cache=True):
+        karnickel.MacroImporter.__init__(self)
+        self.cache = cache
+        self.macro_hashes = {}
+
+    def find_module(self, name, path=None):
+        try:
+            fd, filename, info = imp.find_module(name.split('.')[-1], path)
+        except ImportError:
+            return None
+        if fd is not None:
+            fd.close()
+        package_dir = None
+        if info[2] == imp.PKG_DIRECTORY:
+            package_dir = filename
+            filename = os.path.join(filename, '__init__.py')
+        elif info[2] == imp.PY_COMPILED:
+            filename = filename[:-1]
+        elif info[2] != imp.PY_SOURCE:
+            return None
+        try:
+            with open(filename, 'U') as f:
+                source = f.read()
+        except IOError:
+            return None
+        if MACRO_IMPORT.search(source) is None:
+            # the usual import is faster and uses the .pyc files
+            return None
+        self._cache[name] = filename, source, package_dir
+        return self
+
+    def is_package(self, name):
+        return self._cache[name][2] is not None
+
+    def load_module(self, name):
+        filename, source, package_dir = self._cache[name]
+        module = imp.new_module(name)
+        module.__file__ = filename
+        module.__loader__ = self
+        if package_dir is not None:
+            module.__path__ = [package_dir]
+        code = self.get_code(module, source)
+        sys.modules[name] = module
+        try:
+            exec code in module.__dict__
+        except:
+            del sys.modules[name]
+            raise
+        return module
+
+    def get_code(self, module, source):
+        if not self.cache:
+            return self.expand(module, source)
+        directory, basename = os.path.split(module.__file__)
+        prefix = os.path.splitext(basename)[0] + "."
+        path = os.path.join(directory, CACHE_DIR, "%s%s.code" % (prefix,
+                            self.cache_key(module, source)))
+        try:
+            with open(path, 'rb') as f:
+                return marshal.load(f)
+        except (IOError, EOFError, ValueError, TypeError):
+            pass
+        code = self.expand(module, source)
+        try:
+            write_code(path, code, prefix)
+        except (IOError, OSError):
+            # e.g. a read only installation
+            pass
+        return code
+
+    def expand(self, module, source):
+        tree = ast.parse(source, module.__file__)
+        try:
+            tree = karnickel.Expander(module).visit(tree)
+        except karnickel.MacroCallError, err:
+            err.add_filename(module.__file__)
+            raise
+        return compile(tree, module.__file__, 'exec')
+
+    def cache_key(self, module, source):
+        key = sha1(CACHE_VERSION)
+        key.update(sys.version)
+        key.update(source)
+        for name in MACRO_IMPORT.findall(source):
+            key.update(self.macro_hash(name, module))
+        return key.hexdigest()
+
+    def macro_hash(self, name, module):
+        """ Returns the hash of the source of the macro module name. """
+        try:
+            return self.macro_hashes[name]
+        except KeyError:
+            pass
+        filename = __import__(name, module.__dict__, None, ['*']).__file__
+        if filename.lower().endswith(('c', 'o')):
+            filename = filename[:-1]
+        with open(filename, 'U') as f:
+            digest = self.macro_hashes[name] = sha1(f.read()).hexdigest()
+        return digest
+
+
+def write_code(path, code, prefix):
+    """ Writes code to path and removes the older code of the module, the
+    files in the same directory starting with prefix. """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for name in os.listdir(directory):
+        if name.startswith(prefix):
+            os.remove(os.path.join(directory, name))
+    tmp_path = "%s.%i.tmp" % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        marshal.dump(code, f)
+    os.rename(tmp_path, path)
+
+def install_hook(cache=True):
+    importer = MacroImporter(cache)
+    sys.meta_path.insert(0, importer)
+    return importer
@@ -5,10 +5,13 @@ import pickle
 import optparse
 import traceback
 import gettext
+import json
 from threading import Lock
 
-from flask import Flask, render_template, session, redirect, url_for, \
-        request, abort, jsonify
+from flask import Flask, session, redirect, url_for, \
+        request, abort, jsonify, Response, stream_with_context, \
+        get_template_attribute
+import flask
 from flaskext.babel import Babel
 import flaskext.babel
 from jinja2 import Markup
@@ -25,11 +28,23 @@ app.secret_key = "".join(chr(random.randint(0, 255)) for _ in xrange(32))
 sys.path.append(root_dir)
 
 from domination.gameengine import DominationGame, CardTypeRegistry, Player,\
-        GameRunner, DebugRequest, SelectDeal, SelectHandCards, SelectCard,\
-        YesNoQuestion, Question, MultipleChoice, card_sets, editions, \
-        AIPlayer, Kibitzer, FRESH, ENDED, RUNNING, STATES, TLS
+        GameRunner, ScheduledGameRunner, DebugRequest, SelectDeal, \
+        SelectHandCards, SelectCard, YesNoQuestion, Question, MultipleChoice, \
+        editions, AIPlayer, Kibitzer, FRESH, ENDED, RUNNING, STATES, TLS, \
+        SNAPSHOT_INTERVAL, scheduler, storage_path
 from domination.tools import _, get_translations, ngettext
-from domination.gzip_middleware import GzipMiddleware
+from domination.gamestate import game_state, player_state, diff_state, \
+        viewer_state, API_VERSION
+from domination.gzip_middleware import GzipMiddleware, compress_static
+from domination.strategies import get_strategy, EXAMPLE_SPECS
+from domination.cards import manifest, Card
+from domination import metrics
+from domination.shards import shard_index, game_summary, fetch_runners, \
+        SECRET_KEY_VARIABLE
+from domination.userstore import MemoryUserStore, SQLiteUserStore
+from domination.replay import Replay
+from domination.analytics import Stats, END_REASONS
+from domination.journal import decode_response, KICK
 
 # monkeypatch flask-babel
 flaskext.babel.get_translations = get_translations
@@ -37,29 +52,130 @@ flaskext.babel.get_translations = get_translations
 AI_NAMES = ['Alan', 'Grace', 'Linus', 'Guido', 'Konrad', 'Donald',
             'Miranda', 'Ada', 'Hannah', 'Kim']
 MAX_SEQNO_DIFF = 8
+# seconds between keepalive comments on idle event streams
+EVENT_KEEPALIVE = 15
+# long polls and event streams are not compressed, they would only be sent
+# when they end
+UNCOMPRESSED_PATHS = ("/game/check_seqno/", "/game/events/")
+# number of rendered fragments kept by cached_fragment
+FRAGMENT_CACHE_SIZE = 4096
+# number of loaded replays kept by get_replay
+REPLAY_CACHE_SIZE = 16
+# if one of these changed, the page of a viewer needs to be rendered again
+RELOAD_KEYS = ("state", "round", "kibitzers", "hand", "deck", "discard_pile",
+               "request", "info_cleared")
 
 # init app object and jinja env
 app.games = {}
-app.users = {}
+app.user_store = MemoryUserStore()
 app.languages = {}
 app.game_storage_prefix = os.path.join(root_dir, "game-")
 app.game_storage_postfix = ".pickle"
+app.game_journal_postfix = ".journal"
+app.game_replay_postfix = ".replay"
+# the pages list all cards
+card_sets = manifest.get_card_sets()
 all_card_classes = [cls for cls in CardTypeRegistry.raw_card_classes.itervalues()
                     if cls.optional and cls.implemented]
 app.card_classes = lambda: sorted(all_card_classes, key=lambda x: unicode(x.name)) # not for in-game usage
+def index_card_images():
+    """ Returns a dict mapping the locales to the keys of the cards that have
+    an image in that locale. """
+    images = {}
+    image_dir = os.path.join(root_dir, "domination", "static", "cardimages")
+    for locale in os.listdir(image_dir):
+        if os.path.isdir(os.path.join(image_dir, locale)):
+            images[locale] = frozenset(name[:-4] for name in
+                    os.listdir(os.path.join(image_dir, locale)) if name.endswith(".jpg"))
+    return images
+app.card_images = index_card_images()
 def make_image_url(cardcls):
     locale = str(get_locale())
-    path = os.path.join(root_dir, "domination", "static", "cardimages", locale, cardcls.__name__) + ".jpg"
-    if os.path.exists(path):
+    if cardcls.__name__ in app.card_images.get(locale, ()):
         return url_for('static', filename="cardimages/%s/%s.jpg" % (locale, cardcls.__name__))
-app.template_context_processors[None].append(lambda: {'app': app, 'store': get_store()})
-app.jinja_env.globals.update(gettext=_, ngettext=ngettext, make_image_url=make_image_url, enumerate=enumerate)
+
+app.fragment_cache = {}
+def cached_fragment(key, render):
+    """ Returns the fragment stored for key or stores the result of render.
+    Keys have to cover everything the fragment depends on. """
+    try:
+        return app.fragment_cache[key]
+    except KeyError:
+        pass
+    if len(app.fragment_cache) >= FRAGMENT_CACHE_SIZE:
+        app.fragment_cache.clear()
+    fragment = app.fragment_cache[key] = Markup(render())
+    return fragment
+
+def get_card_infos(card, game):
+    if game is None or not game.hooks["on_render_card_info"]:
+        return ()
+    return tuple((unicode(key), unicode(value)) for key, value in card.get_card_infos(game))
+
+def cached_card_body(card, game=None, player=None):
+    """ Renders the tooltip of card, which only changes with its cost and card
+    infos. """
+    card_infos = get_card_infos(card, game)
+    key = ("card", card.__name__, str(get_locale()), card.get_cost(game, player),
+           card_infos)
+    render_card_body = get_template_attribute("macros.html", "render_card_body")
+    return cached_fragment(key, lambda: render_card_body(card, game, player, card_infos))
+
+def cached_supply_cards(game_runner, player=None):
+    """ Renders the supply of the game of game_runner for player. It is
+    rendered again after pile counts, card costs or card infos changed. """
+    game = game_runner.game
+    card_classes = [game.supply[key].card_class for key in sorted(game.supply)]
+    card_infos = tuple(get_card_infos(card, game) for card in card_classes)
+    # cards like Peddler cost something else for every player
+    player_costs = tuple(card.get_cost(game, player) for card in card_classes
+                         if card.get_cost.im_func is not Card.get_cost.im_func)
+    key = ("supply", game.name, id(game), game_runner.supply_seqno,
+           game.cost_version, player_costs, str(get_locale()), card_infos)
+    render_supply_cards = get_template_attribute("macros.html", "render_supply_cards")
+    return cached_fragment(key, lambda: render_supply_cards(game, player))
+
+app.template_context_processors[None].append(lambda: {'app': app})
+app.jinja_env.globals.update(gettext=_, ngettext=ngettext, make_image_url=make_image_url,
+        enumerate=enumerate, cached_card_body=cached_card_body,
+        cached_supply_cards=cached_supply_cards)
 def finalizer(x):
     if isinstance(x, Markup):
         return x
     return unicode(x)
 app.jinja_env.finalize = finalizer
 app.game_storage_path = None
+app.secure_random = False
+app.runner_class = GameRunner
+app.journal_enabled = False
+app.replays_enabled = False
+app.stats_path = None # file of the statistics shown at /stats
+app.shard_urls = [] # the URLs of all shards if the games are sharded
+app.shard_index = 0
+if os.environ.get(SECRET_KEY_VARIABLE):
+    # the shards share the sessions
+    app.secret_key = os.environ[SECRET_KEY_VARIABLE]
+
+
+def count_runners():
+    counts = dict(((state, ), 0) for state in STATES)
+    for runner in app.games.values():
+        counts[(runner.state, )] += 1
+    return counts
+
+def count_threads():
+    return {("runner", ): sum(runner.is_alive() for runner in app.games.values()),
+            ("scheduler", ): int(scheduler.is_alive())}
+
+metrics.Gauge("domination_games", "Games by state", ["state"], count_runners)
+metrics.Gauge("domination_threads", "Threads that run games", ["kind"],
+              count_threads)
+
+def render_template(template_name, **context):
+    if not metrics.enabled:
+        return flask.render_template(template_name, **context)
+    with metrics.RENDER_SECONDS.time((request.endpoint, )):
+        return flask.render_template(template_name, **context)
 
 
 @babel.localeselector
@@ -88,10 +204,38 @@ def gets_game(func):
     innerfunc.__name__ = func.__name__
     return innerfunc
 
-def get_store(username=None):
-    if username is None and "username" not in session:
-        return None
-    return app.users[username or session["username"]]
+def find_player(game, name):
+    # there are at most MAX_PLAYERS
+    for player in game.players:
+        if player.name == name:
+            return player
+
+def get_player(game, username=None):
+    """ Returns the player of the user, the current one by default, in game
+    or None. """
+    seat = app.user_store.get_seat(username or session["username"], game.name)
+    if seat is not None:
+        return find_player(game, seat)
+
+def get_viewer(game):
+    """ Returns the player or kibitzer of the current user in game or None. """
+    player = get_player(game)
+    if player is not None:
+        return player
+    for kibitzer in game.kibitzers:
+        if kibitzer.name == session["username"]:
+            return kibitzer
+
+def remote_runners():
+    """ Returns the runners of the games on the other shards. """
+    runners = []
+    for index, url in enumerate(app.shard_urls):
+        if index != app.shard_index:
+            try:
+                runners.extend(fetch_runners(url, request.headers.get("Accept-Language")))
+            except (IOError, ValueError), e:
+                app.logger.warning("Could not list the games of %s: %s", url, e)
+    return runners
 
 def render_error(error_msg):
     return render_template("error.html", error_msg=error_msg)
@@ -143,7 +287,7 @@ def get_response(req):
 def login():
     if request.method == 'POST':
         username = request.form['username']
-        if username in app.users:
+        if app.user_store.has_user(username):
             return render_error(_("Username already in use."))
         session['username'] = username
         if request.args.get('url'):
@@ -157,7 +301,7 @@ def login():
 def index():
     if "username" not in session:
         return redirect(url_for('login'))
-    runners = app.games.values()
+    runners = app.games.values() + remote_runners()
     runners.sort(key=lambda runner: (STATES.index(runner.state), runner.game.name))
     return render_template('index.html', runners=runners)
 
@@ -165,15 +309,22 @@ def index():
 def logout():
     # remove the username from the session if its there
     username = session.pop('username', None)
-    store = app.users.pop(username, None)
-    if store:
-        games = store["games"]
-        for game, player in games.items():
+    if username is not None:
+        for game_name, seat in app.user_store.get_seats(username).iteritems():
+            if game_name not in app.games:
+                # the game runs on another shard
+                continue
+            app.user_store.remove_seat(username, game_name)
+            game_runner = app.games[game_name]
+            player = find_player(game_runner.game, seat)
+            if player is None:
+                continue
             # XXX race condition possible
             if player.current:
-                game.kick(Player("Logout Button"), player)
+                game_runner.kick(Player("Logout Button"), player)
             else:
-                game.players.remove(player)
+                game_runner.game.players.remove(player)
+        app.user_store.remove_user(username)
     return redirect(url_for("index"))
 
 @app.route("/create_game", methods=['GET', 'POST'])
@@ -188,11 +339,18 @@ def create_game():
         cards = CardTypeRegistry.keys2classes(request.form.getlist('card_key'))
         if len(cards) != 10:
             return render_error(_("Must specify 10 card sets!"))
-        game = DominationGame(name, cards)
+        strategies = []
+        if request.form.get("ai"):
+            try:
+                strategies = [spec.strip() and get_strategy(spec) or None
+                              for spec in request.form.getlist("aistrategy")]
+            except ValueError, e:
+                return render_error(_("Invalid AI strategy: %s", (unicode(e), )))
+        game = DominationGame(name, cards, secure_random=app.secure_random)
         player = Player(session["username"])
         game.players.append(player)
-        app.games[name] = GameRunner(game, player)
-        get_store()["games"][game] = player
+        app.games[name] = app.runner_class(game, player)
+        app.user_store.add_seat(player.name, name, player.name)
         if request.form.get("ai"):
             names = AI_NAMES[:]
             random.shuffle(names)
@@ -201,7 +359,8 @@ def create_game():
             except ValueError:
                 n = 1
             for i in range(n):
-                player = AIPlayer(names[i] + " [AI]")
+                strategy = strategies[i] if i < len(strategies) else None
+                player = AIPlayer(names[i] + " [AI]", strategy)
                 game.players.append(player)
         return redirect(url_for('game', name=name))
     def transform_sets(sets):
@@ -212,7 +371,10 @@ def create_game():
     name = unicode(_("Game of %s", (session["username"], )))
     newname = name
     ctr = 0
-    while newname in app.games:
+    names = set(app.games)
+    if app.shard_urls:
+        names.update(runner.game.name for runner in remote_runners())
+    while newname in names:
         ctr += 1
         newname = "%s (%i)" % (name, ctr)
     if "card" in request.args:
@@ -222,7 +384,8 @@ def create_game():
         enabled_cards = enabled_editions = ()
     return render_template("create_game.html", editions=editions,
                            card_sets=transform_sets(card_sets), name=newname, enabled_editions=enabled_editions,
-                           enabled_cards=enabled_cards)
+                           enabled_cards=enabled_cards, strategies=EXAMPLE_SPECS,
+                           ai_seats=DominationGame.MAX_PLAYERS - 1)
 
 @app.route("/game/<name>", methods=['GET', 'POST'])
 @needs_login
@@ -230,23 +393,21 @@ def create_game():
 def game(game_runner):
     game = game_runner.game
     seqno = game_runner.seqno
-    if game_runner.game in get_store()["games"]:
+    player = get_player(game)
+    if player is not None:
         # remove inactive kibitzers
         game.kibitzers = [k for k in game.kibitzers
                 if k.last_seqno + MAX_SEQNO_DIFF > seqno]
-        player = get_store()["games"][game_runner.game]
         if request.method == 'POST':
             cv = player.response_condition
             cv.acquire()
-            player.info_queue = []
+            player.info_queue.clear()
             try:
                 req = player.request_queue[0]
                 assert hash(req) == int(request.form["req_id"])
                 response = get_response(req)
                 if response is not Ellipsis:
-                    player.response.append(response)
-                    player.request_queue.pop(0)
-                    cv.notify()
+                    game_runner.deliver_response(player, response)
             finally:
                 cv.release()
             if response is not Ellipsis:
@@ -261,6 +422,7 @@ def game(game_runner):
             if isinstance(req, DebugRequest):
                 # cleanup XXX more
                 del app.games[game.name]
+                app.user_store.remove_game(game.name)
                 raise req.exc_info[0], req.exc_info[1], req.exc_info[2]
         info_queue = player.info_queue
     else:
@@ -286,16 +448,17 @@ def game(game_runner):
 @needs_login
 @gets_game
 def join_game(game_runner):
-    assert not game_runner in get_store()["games"]
+    game = game_runner.game
+    assert get_player(game) is None
     if not game_runner.joinable:
         return render_error(_("Game has begun or ended already."))
-    get_store()["games"][game_runner.game] = player = Player(session["username"])
-    game = game_runner.game
+    player = Player(session["username"])
     assert player not in game.players
     game.players.append(player)
     if len(game.players) > game.MAX_PLAYERS:
         game.players.remove(player)
         return render_error(_("Too many players in the game!"))
+    app.user_store.add_seat(session["username"], game.name, player.name)
     for kibitzer in game.kibitzers:
         if kibitzer.name == session["username"]:
             game.kibitzers.remove(kibitzer)
@@ -318,8 +481,8 @@ def start_game(game_runner):
 @gets_game
 def clear_info(game_runner):
     game = game_runner.game
-    if game_runner.game in get_store()["games"]:
-        player = get_store()["games"][game_runner.game]
+    player = get_player(game)
+    if player is not None:
         info_queue = player.info_queue
     else:
         for kibitzer in game.kibitzers:
@@ -328,7 +491,7 @@ def clear_info(game_runner):
         else:
             return redirect(url_for("game", name=game.name))
         info_queue = kibitzer.info_queue
-    info_queue[:] = []
+    info_queue.clear()
     return redirect(url_for("game", name=game.name))
 
 @app.route("/game/kick_player/<name>/<playername>", methods=["POST"])
@@ -336,10 +499,10 @@ def clear_info(game_runner):
 @gets_game
 def kick_player(game_runner, playername):
     game = game_runner.game
-    if game_runner.game in get_store()["games"]:
-        player = get_store()["games"][game_runner.game]
+    player = get_player(game)
+    if player is not None:
         if player == game_runner.owner:
-            kickee = [x for x in game.players if x.name == playername][0]
+            kickee = find_player(game, playername)
             if kickee == player:
                 return render_error(_("You cannot kick yourself!"))
             # XXX race condition possible
@@ -350,9 +513,10 @@ def kick_player(game_runner, playername):
                 # can be lifted as soon we have an impersonation feature
                 return render_error(_("You cannot kick your last opponent!"))
             if not kickee.is_ai:
-                games = get_store(playername)["games"]
-                del games[game_runner.game]
-            game.kick(player, kickee)
+                username = app.user_store.get_user(game.name, kickee.name)
+                if username is not None:
+                    app.user_store.remove_seat(username, game.name)
+            game_runner.kick(player, kickee)
 
     return redirect(url_for("game", name=game.name))
 
@@ -360,7 +524,7 @@ def kick_player(game_runner, playername):
 @needs_login
 @gets_game
 def cancel_game(game_runner):
-    player = get_store()["games"][game_runner.game]
+    player = get_player(game_runner.game)
     if player is not game_runner.owner:
         abort(401)
     game_runner.cancel()
@@ -371,14 +535,96 @@ def cancel_game(game_runner):
 @needs_login
 @gets_game
 def check_seqno(game_runner):
-    old_seqno = request.args.get('seqno', type=int)
-    cv = game_runner.seqno_condition
-    cv.acquire()
-    while game_runner.seqno == old_seqno:
-        cv.wait()
-    cv.release()
+    metrics.SEQNO_WAITERS.inc(1, ("poll", ))
+    try:
+        game_runner.wait_for_seqno(request.args.get('seqno', type=int))
+    finally:
+        metrics.SEQNO_WAITERS.dec(1, ("poll", ))
     return jsonify()
 
+def render_game_update(game_runner, viewer, old, new):
+    """ Renders the parts of the game page of viewer that changed between
+    the states old and new. Returns None if the page needs a reload. """
+    diff = diff_state(old, new)
+    if any(key in diff for key in RELOAD_KEYS) or \
+            len(old["players"]) != len(new["players"]):
+        return None
+    game = game_runner.game
+    player = viewer if hasattr(viewer, "hand") else None
+    update = {"seqno": new["seqno"]}
+    if "players" in diff:
+        render_players = get_template_attribute("macros.html", "render_players")
+        update["players"] = unicode(render_players(game_runner, game, player))
+    if "supply" in diff:
+        render_supply_count = get_template_attribute("macros.html",
+                                                     "render_supply_count")
+        update["supply"] = dict((key, unicode(render_supply_count(game, key)))
+                                for key in diff["supply"])
+    if "info" in diff:
+        render_info_item = get_template_attribute("macros.html", "render_info_item")
+        update["info"] = u"".join(unicode(render_info_item(event, game, player))
+                for event in viewer.info_queue.since(old["info"], new["info"]))
+    return update
+
+@app.route("/game/events/<name>")
+@needs_login
+@gets_game
+def game_events(game_runner):
+    """ Streams the changes of the game page as server-sent events, starting
+    at the seqno the page was rendered with. """
+    game = game_runner.game
+    seqno = request.args.get('seqno', type=int)
+    viewer = get_viewer(game)
+    if viewer is None:
+        return jsonify(reload=True)
+
+    def get_state():
+        state = game_state(game_runner)
+        state.update(player_state(viewer))
+        return state
+
+    def stream():
+        state = get_state()
+        if state["seqno"] != seqno:
+            yield "data: %s\n\n" % (json.dumps({"reload": True}), )
+            return
+        while True:
+            metrics.SEQNO_WAITERS.inc(1, ("events", ))
+            try:
+                new_seqno = game_runner.wait_for_seqno(state["seqno"], EVENT_KEEPALIVE)
+            finally:
+                metrics.SEQNO_WAITERS.dec(1, ("events", ))
+            if new_seqno == state["seqno"]:
+                yield ": keepalive\n\n"
+                continue
+            TLS.game = game
+            new_state = get_state()
+            if not hasattr(viewer, "hand"):
+                viewer.last_seqno = new_state["seqno"]
+            update = render_game_update(game_runner, viewer, state, new_state)
+            if update is None:
+                yield "data: %s\n\n" % (json.dumps({"reload": True}), )
+                return
+            yield "id: %i\ndata: %s\n\n" % (new_state["seqno"], json.dumps(update))
+            state = new_state
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
+
+@app.route("/api/game/<name>/state")
+@needs_login
+@gets_game
+def api_game_state(game_runner):
+    """ Returns the game state as JSON. If the seqno of the last state the
+    client knows is passed as since, the public part of the state only
+    contains what changed since then. Likewise, info_since limits the info
+    messages of the viewer to the ones after that info seqno. """
+    seqno, full, state = game_runner.state_since(request.args.get('since', type=int))
+    viewer = get_viewer(game_runner.game)
+    return jsonify(version=API_VERSION, seqno=seqno, full=full, state=state,
+                   viewer=viewer and viewer_state(viewer,
+                                                  request.args.get('info_since', 0, type=int)))
+
 
 @app.route("/game/toggle_option/<name>")
 @needs_login
@@ -386,26 +632,129 @@ def check_seqno(game_runner):
 def toggle_option(game_runner):
     key = request.args["optionkey"]
     value = request.args["optionvalue"].lower() == "true"
-    player = get_store()["games"][game_runner.game]
-    player.options[key] = value
+    player = get_player(game_runner.game)
+    game_runner.set_option(player, key, value)
     return jsonify()
 
 
+app.replay_cache = {}
+def get_replay(name):
+    """ Returns the Replay of the game name, it is loaded again after the
+    file changed. """
+    path = storage_path(name, app.game_replay_postfix)
+    key = (path, os.path.getmtime(path), os.path.getsize(path))
+    try:
+        return app.replay_cache[key]
+    except KeyError:
+        pass
+    if len(app.replay_cache) >= REPLAY_CACHE_SIZE:
+        app.replay_cache.clear()
+    replay = app.replay_cache[key] = Replay.load(path)
+    return replay
+
+def describe_response(player, entry):
+    """ Returns a text for the recorded decision entry of player. """
+    kind, decision, name, data = entry[:4]
+    if kind == KICK:
+        return _("%(kicker)s kicked %(kickee)s.", {"kicker": data, "kickee": name})
+    response = decode_response(player, data)
+    if isinstance(response, bool):
+        return _("Yes") if response else _("No")
+    if isinstance(response, basestring) and response in CardTypeRegistry.raw_card_classes:
+        # bought cards are passed by key
+        response = CardTypeRegistry.raw_card_classes[response]
+    if isinstance(response, list):
+        return u", ".join(unicode(getattr(item, "name", item)) for item in response)
+    if response is None:
+        return u"-"
+    return unicode(getattr(response, "name", response))
+
+@app.route("/replay/<name>")
+@needs_login
+def replay(name):
+    """ Shows the game name after the number of decisions passed as
+    decision, with the hands of all players. """
+    if name in app.games and app.games[name].state != ENDED:
+        return render_error(_("The game is still running."))
+    try:
+        replay = get_replay(name)
+        decision = max(0, min(request.args.get("decision", 0, type=int), len(replay)))
+        game, req = replay.seek(decision)
+    except (IOError, OSError, ValueError), e:
+        return render_error(_("Could not replay the game: %s", (unicode(e), )))
+    TLS.game = game
+    response = None
+    if req is not None and decision < len(replay):
+        response = describe_response(req.player, replay.decisions[decision])
+    return render_template("replay.html", game=game, req=req, response=response,
+                           decision=decision, decisions=len(replay))
+
+
+app.stats = (None, None)
+def get_stats():
+    """ Returns the Stats in app.stats_path, they are loaded again after the
+    file changed. """
+    path = app.stats_path
+    key = (os.path.getmtime(path), os.path.getsize(path))
+    loaded_key, stats = app.stats
+    if loaded_key != key:
+        stats = Stats.load(path)
+        app.stats = key, stats
+    return stats
+
+@app.route("/stats")
+def stats_page():
+    """ Shows the statistics of the simulated games, see analytics.py. """
+    if app.stats_path is None:
+        abort(404)
+    try:
+        stats = get_stats()
+    except (IOError, OSError, ValueError), e:
+        return render_error(_("Could not load the statistics: %s", (unicode(e), )))
+    cards = stats.card_rows()
+    card_classes = CardTypeRegistry.keys2classes([row["key"] for row in cards])
+    for row, cls in zip(cards, card_classes):
+        row["name"] = cls.name
+    return render_template("stats.html", kingdoms=stats.kingdom_rows(), cards=cards,
+                           end_reasons=END_REASONS)
+
+
+@app.route("/shard/games")
+def shard_games():
+    """ Lists the games of this shard for the lobby of the first one. """
+    return jsonify(games=[game_summary(runner) for runner in app.games.values()])
+
+@app.route("/metrics")
+def metrics_page():
+    if not metrics.enabled:
+        abort(404)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.before_request
 def before_request():
     if request.authorization and app.auth_enabled:
         session["username"] = request.authorization.username
-    if "username" in session and session["username"] not in app.users:
-        app.users[session["username"]] = {"games": {}}
+    if "username" in session and not app.user_store.has_user(session["username"]):
+        app.user_store.add_user(session["username"])
     session.permanent = True
 
 def restore_game(filename):
     f = file(filename, "rb")
     game_runner = pickle.load(f)
+    f.close()
     game = game_runner.game
+    if app.shard_urls and shard_index(game.name, len(app.shard_urls)) != app.shard_index:
+        return
+    if filename.endswith(app.game_storage_postfix):
+        journal_path = filename[:-len(app.game_storage_postfix)] + app.game_journal_postfix
+        if os.path.exists(journal_path):
+            game_runner.load_journal(journal_path)
     app.games[game.name] = game_runner
     for player in game_runner.game.players:
-        app.users.setdefault(player.name, {}).setdefault("games", {})[game] = player
+        if not player.is_ai:
+            app.user_store.add_user(player.name)
+            app.user_store.add_seat(player.name, game.name, player.name)
     game_runner.daemon = True
     game_runner.start()
 
@@ -424,6 +773,32 @@ def main(argv):
             help='Debug mode', default=None)
     parser.add_option('-a', '--auth', dest='auth', action='store_true',
             help='Use the webservers basic auth information', default=False)
+    parser.add_option('-S', '--secure-random', dest='secure_random', action='store_true',
+            help='Shuffle with the system random source (games cannot be replayed)',
+            default=False)
+    parser.add_option('-m', '--multiplex', dest='multiplex', action='store_true',
+            help='Run all games in a single scheduler thread', default=False)
+    parser.add_option('-J', '--journal', dest='journal', action='store_true',
+            help='Log the decisions of the players and store the full game only'
+            ' every %i rounds' % (SNAPSHOT_INTERVAL, ), default=False)
+    parser.add_option('-R', '--replays', dest='replays', action='store_true',
+            help='Record replays of the games, see /replay/<name>', default=False)
+    parser.add_option('-T', '--stats', dest='stats', action='store',
+            type="string", help='file of simulated game statistics to show at'
+            ' /stats, see analytics.py', default=None)
+    parser.add_option('-z', '--compress-level', dest='compress_level', action='store',
+            type="int", help='gzip level of the responses, 0 turns compression off',
+            default=6)
+    parser.add_option('-M', '--metrics', dest='metrics', action='store_true',
+            help='Record metrics and serve them at /metrics', default=False)
+    parser.add_option('-U', '--user-store', dest='user_store', action='store',
+            type="string", help='SQLite file to keep the users in, servers'
+            ' using the same file share the logins', default=None)
+    parser.add_option('--shard-urls', dest='shard_urls', action='store',
+            type="string", help='comma separated URLs of all shards if the'
+            ' games are sharded, see shards.py', default="")
+    parser.add_option('--shard-index', dest='shard_index', action='store',
+            type="int", help='index of this server in --shard-urls', default=0)
 
     options, args = parser.parse_args()
     if args:
@@ -439,6 +814,21 @@ def main(argv):
         app.secret_key = "insecure"
 
     app.auth_enabled = options.auth
+    app.secure_random = options.secure_random
+    if options.journal and options.secure_random:
+        parser.error("journaled games are replayed, they cannot use the system random source")
+    app.journal_enabled = options.journal
+    if options.replays and options.secure_random:
+        parser.error("replays need seeded games, they cannot use the system random source")
+    app.replays_enabled = options.replays
+    app.stats_path = options.stats
+    metrics.enabled = options.metrics
+    if options.user_store:
+        app.user_store = SQLiteUserStore(options.user_store)
+    app.shard_urls = [url for url in options.shard_urls.split(",") if url]
+    app.shard_index = options.shard_index
+    if options.multiplex:
+        app.runner_class = ScheduledGameRunner
 
     if options.storagepath:
         # XXX does not really work
@@ -447,7 +837,17 @@ def main(argv):
     for filename in options.restore:
         restore_game(filename)
 
-    app.wsgi_app = GzipMiddleware(app.wsgi_app)
+    if options.compress_level:
+        try:
+            compress_static(app.static_folder)
+        except (IOError, OSError), e:
+            print "Could not precompress the static files: %s" % (e, )
+        with app.app_context():
+            static_max_age = app.get_send_file_max_age(None)
+        app.wsgi_app = GzipMiddleware(app.wsgi_app, options.compress_level,
+                skip_paths=UNCOMPRESSED_PATHS, static_dir=app.static_folder,
+                static_url=app.static_url_path + "/",
+                static_max_age=static_max_age)
     app.run(host=options.server_ip, port=options.server_port, debug=options.debug, threaded=True)
 
 if __name__ == '__main__':
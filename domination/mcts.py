@@ -0,0 +1,195 @@
+""" Monte Carlo tree search for the buys of AI players: every card the
+player could buy is tried in rollouts, i.e. games played to the end by a
+fast policy on clones of the game, and the card with the best win rate is
+bought. The candidates are picked for rollouts with UCB1, so promising
+cards get most of the budget. See the mcts strategy.
+
+Rollouts run in a pool of worker processes. In processes that cannot have
+children, e.g. the workers of the simulator, they run in the calling
+thread. """
+
+import sys
+import math
+import time
+import pickle
+import traceback
+from random import Random
+from multiprocessing import Pool, cpu_count, current_process
+
+from domination.gameengine import InfoRequest, Checkpoint, EndOfGameException, \
+        TLS
+
+
+# rounds after which a rollout is scored by the points at that time
+ROLLOUT_ROUNDS = 30
+# point lead that scores about 0.88 instead of 0.5
+MARGIN_SCALE = 10.0
+# standard errors by which a card has to beat the choice of the rollout
+# policy to be bought instead
+CONFIDENCE = 1.0
+# the most expensive buyable cards are tried, besides the choice of the
+# rollout policy and buying nothing
+CANDIDATES = 4
+EXPLORATION = math.sqrt(2)
+ROLLOUTS_PER_TASK = 4
+
+processes = cpu_count()
+pool = None
+
+
+def get_pool():
+    global pool
+    if pool is None and processes > 1 and not current_process().daemon:
+        pool = Pool(processes)
+    return pool
+
+
+def get_rollout_policy():
+    from domination.strategies import BigMoney
+    return BigMoney()
+
+
+def candidates(req):
+    """ Returns the keys of the cards that are tried for req. """
+    game = req.game
+    cards = sorted([c for c in req.cards if req.is_buyable(c)],
+                   key=lambda c: (game.card_cost(c), c.__name__), reverse=True)
+    keys = [None, get_rollout_policy().buy(req)]
+    keys.extend(c.__name__ for c in cards[:CANDIDATES])
+    return sorted(set(keys))
+
+
+def rollout(game, player_index, key, max_round):
+    """ Buys the card key (or nothing if None) for the player with the index
+    player_index in game, ends the turn and plays until the end of the game
+    or max_round. Returns a reward between 0 and 1 that grows with the point
+    lead of the player over its best opponent, 0.5 for a tie. A lead scores
+    less than a win would, but separates close candidates better. game is
+    modified. """
+    player = game.players[player_index]
+    if key is not None:
+        player.discard_pile.append(game.supply[key].pop())
+    player.__exit__(None, None, None)
+    game.discard_turn(player, game.cards_to_draw)
+    policy = get_rollout_policy()
+    previous_game = getattr(TLS, "game", None)
+    TLS.game = game
+    try:
+        gen = game.play_rest_of_game(game.pending_round_players or [])
+        reply = None
+        while True:
+            req = gen.send(reply)
+            reply = None
+            if isinstance(req, InfoRequest):
+                continue
+            if isinstance(req, Checkpoint):
+                if game.round >= max_round:
+                    game.end_of_game()
+                continue
+            reply = policy.respond(req)
+    except EndOfGameException:
+        pass
+    finally:
+        TLS.game = previous_game
+    points = [p.points(game) for p in game.players]
+    own = points.pop(player_index)
+    return 0.5 + 0.5 * math.tanh((own - max(points)) / MARGIN_SCALE)
+
+
+def run_rollouts(task):
+    """ Plays the rollouts of task, a tuple (pickled game, player index,
+    list of (card key, seed), max round). Returns a list of (card key,
+    reward), the reward is None if the rollout crashed. """
+    data, player_index, rollouts, max_round = task
+    game = pickle.loads(data)
+    results = []
+    for key, seed in rollouts:
+        try:
+            reward = rollout(game.clone(Random(seed)), player_index, key, max_round)
+        except Exception:
+            # broken cards should not decide the buy
+            traceback.print_exc(file=sys.stderr)
+            reward = None
+        results.append((key, reward))
+    return results
+
+
+def search(req, rollouts, seconds, random):
+    """ Returns the key of the card to buy for the SelectDeal request req
+    or None, after at most rollouts rollouts or seconds seconds. random
+    seeds the rollouts. The n-th rollouts of all candidates share a seed, so
+    the candidates are compared on the same draws. """
+    policy_key = get_rollout_policy().buy(req)
+    keys = candidates(req)
+    if len(keys) == 1:
+        return keys[0]
+    game = req.game
+    player_index = game.players.index(req.player)
+    max_round = game.round + ROLLOUT_ROUNDS
+    # the clone is pickled without the pending request
+    data = pickle.dumps(game.clone(Random(0)), -1)
+    # the rewards of every key by the number of the rollout
+    rewards = dict((key, {}) for key in keys)
+    visits = dict((key, 0) for key in keys)
+    seeds = []
+    pool = get_pool()
+    deadline = time.time() + seconds
+    while sum(visits.values()) < rollouts and time.time() < deadline:
+        size = min(rollouts - sum(visits.values()),
+                   ROLLOUTS_PER_TASK * (processes if pool else 1))
+        wave = select(rewards, visits, size, random)
+        while len(seeds) < max(n for key, n in wave) + 1:
+            seeds.append(random.getrandbits(32))
+        tasks = [(data, player_index, [(key, seeds[n]) for key, n in
+                  wave[i:i + ROLLOUTS_PER_TASK]], max_round)
+                 for i in xrange(0, len(wave), ROLLOUTS_PER_TASK)]
+        if pool is not None:
+            results = pool.map(run_rollouts, tasks)
+        else:
+            results = [run_rollouts(task) for task in tasks]
+        for (key, n), (_, reward) in zip(wave, sum(results, [])):
+            if reward is not None:
+                rewards[key][n] = reward
+    return best_key(rewards, policy_key)
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def select(rewards, visits, size, random):
+    """ Returns the next size rollouts by UCB1 as (key, number of the
+    rollout of key) and counts them in visits. rewards maps the keys to
+    the rewards of their finished rollouts by number. The pending
+    rollouts count as rollouts without reward. """
+    wave = []
+    for _ in xrange(size):
+        total = sum(visits.values())
+        def ucb(key):
+            if not visits[key]:
+                return (1, random.random())
+            value = sum(rewards[key].values()) / visits[key]
+            return (0, value + EXPLORATION * math.sqrt(math.log(total) / visits[key]))
+        key = max(visits, key=ucb)
+        wave.append((key, visits[key]))
+        visits[key] += 1
+    return wave
+
+
+def best_key(rewards, policy_key):
+    """ Returns the key with the best mean reward if it beats policy_key,
+    the choice of the rollout policy, by CONFIDENCE standard errors on the
+    rollouts that both played. Otherwise policy_key is returned, a handful
+    of noisy rollouts should not overrule a sane default. """
+    best = policy_key
+    best_margin = 0.0
+    for key in rewards:
+        common = [n for n in rewards[key] if n in rewards[policy_key]]
+        if key == policy_key or len(common) < 2:
+            continue
+        differences = [rewards[key][n] - rewards[policy_key][n] for n in common]
+        margin = mean(differences)
+        variance = sum((d - margin) ** 2 for d in differences) / (len(common) - 1)
+        if margin > max(best_margin, CONFIDENCE * math.sqrt(variance / len(common))):
+            best, best_margin = key, margin
+    return best
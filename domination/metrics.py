@@ -0,0 +1,160 @@
+""" Counters, gauges and histograms of the server in the text format of
+Prometheus, served by /metrics if the server runs with --metrics. Until
+then enabled is false and recording costs the check of that flag. """
+
+import time
+from bisect import bisect_left
+from threading import Lock
+
+
+enabled = False
+registry = []
+
+# in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60, 300)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def format_labels(names, values, extra=()):
+    pairs = zip(names, values) + list(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\")
+            .replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs)
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(object):
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = Lock()
+        self.values = {}
+        registry.append(self)
+
+    def samples(self):
+        """ Returns a list of (name suffix, label values, extra labels,
+        value). """
+        with self.lock:
+            return [("", key, (), value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.help),
+                 "# TYPE %s %s" % (self.name, self.kind)]
+        for suffix, key, extra, value in self.samples():
+            lines.append("%s%s%s %s" % (self.name, suffix,
+                    format_labels(self.labels, key, extra), format_value(value)))
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, labels=()):
+        if not enabled:
+            return
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """ A value that goes up and down. If func is passed, it is called at
+    every scrape and returns a dict mapping label value tuples to the
+    values. """
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), func=None):
+        Metric.__init__(self, name, help, labels)
+        self.func = func
+
+    def inc(self, amount=1, labels=()):
+        if not enabled:
+            return
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+    def samples(self):
+        if self.func is not None:
+            return [("", key, (), value) for key, value in sorted(self.func().items())]
+        return Metric.samples(self)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        Metric.__init__(self, name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        if not enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                # bucket counts, then the count of larger values and the sum
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def time(self, labels=()):
+        """ Returns a context manager that observes the seconds its block
+        takes. """
+        return Timer(self, labels)
+
+    def samples(self):
+        result = []
+        with self.lock:
+            items = sorted((key, counts[:]) for key, counts in self.values.items())
+        for key, counts in items:
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"), ), counts):
+                total += count
+                result.append(("_bucket", key, [("le", format_value(float(bound)))], total))
+            result.append(("_sum", key, (), counts[-1]))
+            result.append(("_count", key, (), total))
+        return result
+
+
+class Timer(object):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.time() - self.start, self.labels)
+
+
+def render():
+    """ Returns all metrics in the text exposition format. """
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+REQUEST_SECONDS = Histogram("domination_request_seconds",
+        "Time from a request to a human player until the answer",
+        ["type"])
+STORE_SECONDS = Histogram("domination_store_seconds",
+        "Time to store a game snapshot")
+STORE_BYTES = Histogram("domination_store_bytes",
+        "Size of the stored game snapshots", buckets=SIZE_BUCKETS)
+RENDER_SECONDS = Histogram("domination_render_seconds",
+        "Time to render the template of a page", ["endpoint"])
+SEQNO_WAITERS = Gauge("domination_seqno_waiters",
+        "Clients waiting for a game to change", ["kind"])
@@ -0,0 +1,105 @@
+""" Attributes the time a game spends to the card effects and hooks, see
+Game.profile. Only the time a generator runs itself is counted, not the
+time of the generators it forwards (e.g. the on_gain_card hooks fired by an
+action) and not the time until a request is answered. """
+
+import time
+from types import GeneratorType
+
+from domination.gameengine import Request, InfoRequest, Checkpoint
+
+
+CALLS, REQUESTS, WALL, CPU = range(4)
+
+
+class Profile(object):
+    """ Wall and CPU time and number of requests per (kind, card) where kind
+    is "play", "duration" or the name of a hook. The CPU time is the one of
+    the process, so it includes other threads in the web server. """
+    def __init__(self):
+        self.stats = {}
+        self.stack = []
+        self.last_wall = self.last_cpu = 0.0
+        self.last_request = None
+
+    def __getstate__(self):
+        return self.stats
+
+    def __setstate__(self, stats):
+        self.__init__()
+        self.stats = stats
+
+    def entry(self, kind, card):
+        key = (kind, card.__name__)
+        try:
+            return self.stats[key]
+        except KeyError:
+            entry = self.stats[key] = [0, 0, 0.0, 0.0]
+            return entry
+
+    def switch(self):
+        """ Charges the time since the last switch to the innermost running
+        entry. """
+        wall, cpu = time.time(), time.clock()
+        if self.stack:
+            entry = self.stack[-1]
+            entry[WALL] += wall - self.last_wall
+            entry[CPU] += cpu - self.last_cpu
+        self.last_wall, self.last_cpu = wall, cpu
+
+    def call(self, kind, card, func, *args):
+        """ Calls func with args and returns its result. A returned generator
+        is wrapped so that the time of every step is counted. """
+        entry = self.entry(kind, card)
+        entry[CALLS] += 1
+        self.switch()
+        self.stack.append(entry)
+        try:
+            result = func(*args)
+        finally:
+            self.switch()
+            self.stack.pop()
+        if isinstance(result, GeneratorType):
+            return self.forward(entry, result)
+        return result
+
+    def forward(self, entry, gen):
+        reply = None
+        while True:
+            self.switch()
+            self.stack.append(entry)
+            try:
+                item = gen.send(reply)
+            except StopIteration:
+                return
+            finally:
+                self.switch()
+                self.stack.pop()
+            # every generator on the way up sees the request, the innermost
+            # one asked for it
+            if item is not self.last_request and isinstance(item, Request) \
+                    and not isinstance(item, (InfoRequest, Checkpoint)):
+                self.last_request = item
+                entry[REQUESTS] += 1
+            reply = (yield item)
+
+    def rows(self):
+        """ Returns a list of [kind, card name, calls, requests, wall time,
+        CPU time], the most expensive first. """
+        return sorted(([kind, name] + entry for (kind, name), entry
+                       in self.stats.iteritems()), key=lambda row: -row[-1])
+
+    def merge(self, rows):
+        """ Adds the rows of another profile. """
+        for row in rows:
+            entry = self.stats.setdefault(tuple(row[:2]), [0, 0, 0.0, 0.0])
+            for i, value in enumerate(row[2:]):
+                entry[i] += value
+
+    def report(self, limit=None):
+        lines = ["%9s %9s %7s %8s  %-18s %s" % ("cpu [ms]", "wall [ms]", "calls",
+                                               "requests", "kind", "card")]
+        for kind, name, calls, requests, wall, cpu in self.rows()[:limit]:
+            lines.append("%9.1f %9.1f %7i %8i  %-18s %s" % (cpu * 1000, wall * 1000,
+                         calls, requests, kind, name))
+        return "\n".join(lines)
@@ -0,0 +1,165 @@
+""" Replays of games. A Recording writes the seed, the kingdom and the seats
+of a game and then every decision, like the journal but with the seqno and
+the type of each request, and it is never truncated. Games are seeded, so
+Replay can play a recorded game again up to any decision. It keeps a
+snapshot of the start of every round it played through and seeks from the
+nearest one, so a seek only replays the decisions of one round. """
+
+import json
+import pickle
+from bisect import bisect
+from threading import Lock
+
+from domination.journal import Journal, decode_response, KICK, OPTION
+from domination.gameengine import DominationGame, Player, AIPlayer, Kibitzer, \
+        InfoRequest, Checkpoint, EndOfGameException, PlayerKickedException, TLS
+from domination.cards import CardTypeRegistry
+
+
+# bump if the format of the header or the entries changes incompatibly
+VERSION = 1
+
+
+def seat(player):
+    """ Returns what the header stores of player. """
+    strategy = getattr(player, "strategy", None)
+    return {"name": player.name, "ai": player.is_ai,
+            "strategy": strategy and strategy.spec, "options": player.options}
+
+class Recording(Journal):
+    """ A replay file. The first line is a JSON header, every other one an
+    entry [kind, decision, player name, data, seqno, request type], see
+    Journal. Options have no seqno and request type. """
+    def start(self, game):
+        self.truncate()
+        self.write({"version": VERSION, "name": game.name, "seed": game.seed,
+                    "kingdom": game.selected_cards_keys,
+                    "seats": [seat(player) for player in game.players]})
+
+    def resume(self, decisions):
+        """ Drops the entries from decision number decisions on, the game
+        was restored from a snapshot and takes them again. """
+        header, entries = read(self.path)
+        self.truncate()
+        self.write(header)
+        for entry in entries:
+            if entry[1] < decisions:
+                self.write(entry)
+
+    def append(self, kind, decision, player, data, req=None):
+        entry = [kind, decision, player.name, data]
+        if req is not None:
+            entry += [req.seqno, type(req).__name__]
+        self.write(entry)
+
+
+def read(path):
+    """ Returns the header and the entries of the replay file at path. A
+    partially written last line is ignored. """
+    entries = []
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != VERSION:
+            raise ValueError("Unsupported replay version %r" % (header.get("version"), ))
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+    return header, entries
+
+
+class Replay(object):
+    """ Plays the recorded game again. The methods may be called from
+    several threads. """
+    def __init__(self, header, entries):
+        self.header = header
+        # the answered requests, the n-th entry is decision n
+        self.decisions = [entry for entry in entries if entry[0] != OPTION]
+        self.options = {} # decision -> option entries taken before it
+        for entry in entries:
+            if entry[0] == OPTION:
+                self.options.setdefault(entry[1], []).append(entry)
+        # the pickled games at the starts of the rounds played so far and
+        # the number of decisions taken before them
+        self.snapshots = []
+        self.snapshot_decisions = []
+        self.lock = Lock()
+
+    @classmethod
+    def load(cls, path):
+        return cls(*read(path))
+
+    def __len__(self):
+        return len(self.decisions)
+
+    def new_game(self):
+        from domination.strategies import get_strategy
+        header = self.header
+        game = DominationGame(header["name"], CardTypeRegistry.keys2classes(
+            [str(key) for key in header["kingdom"]]), header["seed"])
+        for seat in header["seats"]:
+            if seat["ai"]:
+                player = AIPlayer(seat["name"], seat["strategy"] and
+                                  get_strategy(seat["strategy"]))
+            else:
+                player = Player(seat["name"])
+            player.options.update(seat["options"])
+            game.players.append(player)
+        return game
+
+    def seek(self, decision):
+        """ Returns the game after decision decisions and the request of the
+        decision, or None if the game ended before. """
+        with self.lock:
+            index = bisect(self.snapshot_decisions, decision) - 1
+            if index < 0:
+                game = self.new_game()
+            else:
+                game = pickle.loads(self.snapshots[index])
+            TLS.game = game
+            gen = game.play_game(index >= 0)
+            reply = None
+            while True:
+                try:
+                    req = gen.send(reply)
+                except EndOfGameException:
+                    return game, None
+                reply = None
+                if isinstance(req, InfoRequest):
+                    req.player.info_queue.append(req)
+                elif isinstance(req, Checkpoint):
+                    self.add_snapshot(game)
+                elif game.decisions >= min(decision, len(self.decisions)):
+                    return game, req
+                else:
+                    reply = self.answer(game, req)
+
+    def add_snapshot(self, game):
+        if not self.snapshots or self.snapshot_decisions[-1] < game.decisions:
+            self.snapshots.append(pickle.dumps(game, -1))
+            self.snapshot_decisions.append(game.decisions)
+
+    def answer(self, game, req):
+        """ Returns the recorded reply to req. """
+        player = req.player
+        for kind, decision, name, (key, value) in self.options.get(game.decisions, ()):
+            for participant in game.players:
+                if participant.name == name:
+                    participant.options[key] = value
+        entry = self.decisions[game.decisions]
+        kind, decision, name, data = entry[:4]
+        if name != player.name or len(entry) > 5 and entry[5] != type(req).__name__:
+            raise ValueError("The replay does not match the game at decision %i"
+                             % (decision, ))
+        game.decisions += 1
+        if kind == KICK:
+            kicker = [p for p in game.participants if p.name == data]
+            player.request_queue.append(req)
+            game.kick(kicker[0] if kicker else Kibitzer(data), player)
+            player.response = []
+            player.name += " (kicked)"
+            return PlayerKickedException(player)
+        if player.is_ai:
+            player.redraw(req)
+        return decode_response(player, data)
@@ -0,0 +1,218 @@
+""" Runs the games on several server processes, the shards. A game lives on
+the shard its name hashes to, see shard_index. The router forwards the
+requests of a game to its shard and everything else to the first shard,
+which shows the games of all shards in the lobby. The shards have to share
+the secret key of the sessions, it is passed in DOMINATION_SECRET_KEY.
+
+$ python domination/shards.py -n 4 -p 8080 -- -m -J
+starts a router on port 8080 and 4 shards on the following ports, the
+options after -- are passed to the shards (see main.py). Shards running on
+other hosts are given with -u instead. """
+
+import os
+import sys
+import json
+import time
+import zlib
+import signal
+import socket
+import httplib
+import urllib2
+import optparse
+import subprocess
+from urllib import quote
+from urlparse import urlsplit
+from multiprocessing import cpu_count
+
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.wrappers import Request, Response
+
+
+# headers that only concern a single connection
+HOP_BY_HOP = frozenset(["connection", "keep-alive", "proxy-authenticate",
+                        "proxy-authorization", "te", "trailers",
+                        "transfer-encoding", "upgrade"])
+# seconds to wait for the lobby of another shard
+LOBBY_TIMEOUT = 5
+# seconds to wait for started shards to accept connections
+STARTUP_TIMEOUT = 60
+CHUNK_SIZE = 64 * 1024
+SECRET_KEY_VARIABLE = "DOMINATION_SECRET_KEY"
+
+
+def shard_index(name, count):
+    """ Returns the index of the shard that runs the game name. It has to be
+    the same in every process, so hash() cannot be used. """
+    if isinstance(name, unicode):
+        name = name.encode("utf-8")
+    return (zlib.crc32(name) & 0xffffffff) % count
+
+
+def game_summary(runner):
+    """ Returns what the lobby shows of the game of runner. """
+    game = runner.game
+    return {"name": game.name, "state": runner.state, "round": game.round,
+            "player_names": game.player_names,
+            "selected_cards_keys": game.selected_cards_keys,
+            "selected_cards_str": game.selected_cards_str}
+
+class RemoteGame(object):
+    def __init__(self, summary):
+        self.__dict__.update(summary)
+
+class RemoteRunner(object):
+    """ Stands in for the GameRunner of a game on another shard in the
+    lobby. """
+    def __init__(self, summary):
+        self.state = summary["state"]
+        self.game = RemoteGame(summary)
+
+def fetch_runners(url, accept_language=None):
+    """ Returns RemoteRunners for the games of the shard at url. """
+    req = urllib2.Request(url.rstrip("/") + "/shard/games")
+    if accept_language:
+        # the card names are translated
+        req.add_header("Accept-Language", accept_language)
+    data = json.load(urllib2.urlopen(req, timeout=LOBBY_TIMEOUT))
+    return [RemoteRunner(summary) for summary in data["games"]]
+
+
+class Router(object):
+    """ WSGI application that forwards the requests to the shards at
+    shard_urls. url_map is the URL map of the shards, it tells which
+    requests concern a game. """
+    def __init__(self, shard_urls, url_map):
+        self.shard_urls = shard_urls
+        self.url_map = url_map
+
+    def shards_for(self, request):
+        """ Returns the indexes of the shards request is forwarded to, the
+        response of the first one is sent. """
+        if request.path.startswith("/shard/"):
+            raise NotFound()
+        try:
+            endpoint, args = self.url_map.bind_to_environ(request.environ).match()
+        except HTTPException:
+            return [0]
+        name = args.get("name")
+        if endpoint == "create_game" and request.method == "POST":
+            name = request.form.get("name")
+        if name:
+            return [shard_index(name, len(self.shard_urls))]
+        if endpoint == "logout":
+            # every shard knows the user
+            return range(len(self.shard_urls))
+        return [0]
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        try:
+            body = request.get_data()
+            shards = self.shards_for(request)
+        except HTTPException, e:
+            return e(environ, start_response)
+        try:
+            responses = [self.forward(self.shard_urls[index], request, body)
+                         for index in shards]
+        except (socket.error, httplib.HTTPException), e:
+            return Response("Shard not available: %s" % (e, ), 502)(
+                    environ, start_response)
+        for conn, response in responses[1:]:
+            response.read()
+            conn.close()
+        conn, response = responses[0]
+        headers = []
+        for line in response.msg.headers:
+            # not response.getheaders(), it joins the Set-Cookie headers
+            name, value = line.split(":", 1)
+            if name.lower() not in HOP_BY_HOP:
+                headers.append((name, value.strip()))
+        start_response("%i %s" % (response.status, response.reason), headers)
+        return self.stream(conn, response)
+
+    def forward(self, url, request, body):
+        parts = urlsplit(url)
+        conn = httplib.HTTPConnection(parts.hostname, parts.port)
+        headers = dict((name, value) for name, value in request.headers.items()
+                       if name.lower() not in HOP_BY_HOP)
+        headers["X-Forwarded-For"] = request.remote_addr or ""
+        path = quote(request.environ.get("PATH_INFO", "") or "/", "/:@&=+$,;~!*'()")
+        if request.query_string:
+            path += "?" + request.query_string
+        conn.request(request.method, path, body, headers)
+        return conn, conn.getresponse()
+
+    def stream(self, conn, response):
+        try:
+            if response.getheader("content-type", "").startswith("text/event-stream") \
+                    and not response.chunked:
+                # events are sent as soon as they are complete
+                for line in iter(response.fp.readline, ""):
+                    yield line
+            else:
+                while True:
+                    data = response.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    yield data
+        finally:
+            conn.close()
+
+
+def wait_for_shards(urls, timeout=STARTUP_TIMEOUT):
+    deadline = time.time() + timeout
+    for url in urls:
+        parts = urlsplit(url)
+        while True:
+            try:
+                socket.create_connection((parts.hostname, parts.port), 1).close()
+                break
+            except socket.error:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [options] [-- shard options]",
+            description=__doc__)
+    parser.add_option('-i', '--server-ip', dest='server_ip', action='store', type="string",
+            help='ip/hostname to run the router on', default="0.0.0.0")
+    parser.add_option('-p', '--server-port', dest='server_port', action='store',
+            type="int", help='port to run the router on', default=8080)
+    parser.add_option('-n', '--shards', dest='shards', action='store', type="int",
+            help='number of shards to start', default=cpu_count())
+    parser.add_option('-u', '--shard-url', dest='shard_urls', action='append',
+            type="string", help='URL of a running shard, no shards are started'
+            ' if given', default=[])
+
+    options, args = parser.parse_args(argv)
+    from domination.main import app
+    processes = []
+    shard_urls = options.shard_urls
+    if not shard_urls:
+        shard_urls = ["http://127.0.0.1:%i" % (options.server_port + i + 1, )
+                      for i in xrange(options.shards)]
+        env = dict(os.environ)
+        env.setdefault(SECRET_KEY_VARIABLE, os.urandom(32).encode("hex"))
+        main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+        for i, url in enumerate(shard_urls):
+            processes.append(subprocess.Popen([sys.executable, main_py,
+                "-i", "127.0.0.1", "-p", str(urlsplit(url).port),
+                "--shard-index", str(i), "--shard-urls", ",".join(shard_urls)] + args,
+                env=env))
+    # terminate the shards on SIGTERM too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    try:
+        wait_for_shards(shard_urls)
+        from werkzeug.serving import run_simple
+        run_simple(options.server_ip, options.server_port,
+                   Router(shard_urls, app.url_map), threaded=True)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+if __name__ == '__main__':
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+    main(sys.argv[1:])
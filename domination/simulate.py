@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import json
+import optparse
+import traceback
+from random import SystemRandom
+from functools import partial
+from multiprocessing import Pool, cpu_count
+
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_dir)
+
+from domination.gameengine import DominationGame, Player, InfoRequest, \
+        Checkpoint, EndOfGameException, TLS, ROUND_LIMIT, SelectDeal
+from domination.cards import CardTypeRegistry, manifest
+from domination.strategies import get_strategy
+from domination.profiler import Profile
+
+
+MAX_ROUNDS = 100
+
+random = SystemRandom()
+
+
+def choose_wisely(req):
+    return req.choose_wisely()
+
+
+def random_kingdom():
+    return random.sample(sorted(manifest.kingdom_keys()), 10)
+
+def resolve_kingdom(spec):
+    """ Turns a kingdom spec into a list of 10 card keys. A spec is either
+    the name of a card set, a comma separated list of card keys or
+    "random". """
+    if spec == "random":
+        return random_kingdom()
+    for name, keys in manifest.card_set_keys:
+        if spec == name:
+            return keys[:]
+    keys = [key.strip() for key in spec.split(",") if key.strip()]
+    for key in keys:
+        if key not in manifest.cards:
+            raise ValueError("Unknown card %r" % (key, ))
+    if len(keys) != 10:
+        raise ValueError("A kingdom needs 10 cards, got %i" % (len(keys), ))
+    return keys
+
+
+def run_game(game, deciders, max_rounds=MAX_ROUNDS):
+    """ Drives the play_game generator of game until the game ends.
+    deciders maps every player to a function answering its requests. """
+    TLS.game = game
+    gen = game.play_game(False)
+    reply = None
+    while True:
+        try:
+            req = gen.send(reply)
+        except EndOfGameException:
+            break
+        reply = None
+        if isinstance(req, InfoRequest):
+            continue
+        if isinstance(req, Checkpoint):
+            if game.round >= max_rounds:
+                game.end_of_game_reason = ROUND_LIMIT
+                try:
+                    game.end_of_game()
+                except EndOfGameException:
+                    break
+            continue
+        reply = deciders[req.player](req)
+    return game
+
+
+def counting_buys(respond, buys):
+    """ Wraps the decider respond to count the cards it buys in the dict
+    buys. """
+    def decide(req):
+        reply = respond(req)
+        if reply is not None and isinstance(req, SelectDeal):
+            buys[reply] = buys.get(reply, 0) + 1
+        return reply
+    return decide
+
+def play_game(task, profile=False):
+    """ Plays a single game, task is a tuple (game number, card keys,
+    strategy specs of the players, max rounds, seed). Returns a dict
+    describing the result. Playing the same task again yields the same
+    game. If profile is true, the result contains the rows of the profile
+    of the game (see Profile.rows). """
+    game_no, card_keys, kinds, max_rounds, seed = task
+    start = time.time()
+    game = DominationGame("simulation %i" % (game_no, ),
+                          CardTypeRegistry.keys2classes(card_keys), seed)
+    if profile:
+        game.profile = Profile()
+    deciders = {}
+    buys = [{} for kind in kinds]
+    for i, kind in enumerate(kinds):
+        player = Player("CPU%i (%s)" % (i, kind))
+        game.players.append(player)
+        deciders[player] = counting_buys(get_strategy(kind).respond, buys[i])
+    result = {
+        "game": game_no,
+        "seed": game.seed,
+        "kingdom": card_keys,
+        "players": [player.name for player in game.players],
+        "points": None,
+        "winner": None,
+        "rounds": None,
+        "end_reason": None,
+        "error": None,
+        "buys": buys, # the card keys bought by every player and how often
+    }
+    try:
+        run_game(game, deciders, max_rounds)
+    except Exception:
+        # a broken card should not take down the whole batch
+        result["error"] = traceback.format_exc()
+    else:
+        points = [player.points(game) for player in game.players]
+        best = max(points)
+        if points.count(best) == 1:
+            result["winner"] = game.players[points.index(best)].name
+        result["points"] = points
+        result["end_reason"] = game.end_of_game_reason or None
+    result["rounds"] = game.round
+    result["duration"] = time.time() - start
+    if profile:
+        result["profile"] = game.profile.rows()
+    return result
+
+
+def simulate(kingdoms, kinds, count, processes=None, max_rounds=MAX_ROUNDS,
+             seed=None, profile=False):
+    """ Plays count games for every kingdom (a list of card key lists) with
+    the given player strategies. Yields the result dicts in the order the
+    games finish. processes=1 plays all games in the calling process. If
+    seed is given, the n-th game is seeded with seed + n. """
+    tasks = []
+    for card_keys in kingdoms:
+        for _ in xrange(count):
+            game_seed = None
+            if seed is not None:
+                game_seed = seed + len(tasks)
+            tasks.append((len(tasks), card_keys, kinds, max_rounds, game_seed))
+    return play_games(tasks, processes, profile)
+
+def play_games(tasks, processes=None, profile=False):
+    """ Plays the games of the tasks (see play_game) in processes worker
+    processes and yields the results in the order the games finish. """
+    if processes == 1:
+        for task in tasks:
+            yield play_game(task, profile)
+        return
+    pool = Pool(processes)
+    try:
+        for result in pool.imap_unordered(partial(play_game, profile=profile), tasks):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [options] [kingdom ...]",
+            description="Plays games without the web frontend. A kingdom is"
+            " the name of a card set, a comma separated list of card keys or"
+            " 'random'.")
+    parser.add_option('-n', '--games', dest='games', action='store', type="int",
+            help='number of games per kingdom', default=10)
+    parser.add_option('-p', '--player', dest='players', action='append',
+            type="string", help='strategy of the player of the next seat, e.g.'
+            ' wise, random, bigmoney, bigmoney+Smithy, engine, mcts or'
+            ' priority:Province,Gold,Silver', default=[])
+    parser.add_option('-j', '--processes', dest='processes', action='store',
+            type="int", help='number of worker processes', default=cpu_count())
+    parser.add_option('-r', '--max-rounds', dest='max_rounds', action='store',
+            type="int", help='abort games after this many rounds', default=MAX_ROUNDS)
+    parser.add_option('-s', '--seed', dest='seed', action='store',
+            type="int", help='seed of the first game, to reproduce a batch', default=None)
+    parser.add_option('-q', '--quiet', dest='quiet', action='store_true',
+            help='only print the summary', default=False)
+    parser.add_option('-P', '--profile', dest='profile', action='store_true',
+            help='print the time spent in every card effect and hook', default=False)
+
+    options, args = parser.parse_args(argv)
+    kinds = options.players or ["wise", "wise"]
+    if len(kinds) < 2:
+        parser.error("need at least two players")
+    if len(kinds) > DominationGame.MAX_PLAYERS:
+        parser.error("at most %i players are supported" % (DominationGame.MAX_PLAYERS, ))
+    try:
+        for kind in kinds:
+            get_strategy(kind)
+        kingdoms = [resolve_kingdom(spec) for spec in args or ["random"]]
+    except ValueError, e:
+        parser.error(str(e))
+
+    wins = {}
+    games = errors = 0
+    profile = Profile()
+    start = time.time()
+    for result in simulate(kingdoms, kinds, options.games, options.processes,
+                           options.max_rounds, options.seed, options.profile):
+        games += 1
+        if options.profile:
+            profile.merge(result["profile"])
+        if result["error"]:
+            errors += 1
+        if result["winner"] is not None:
+            wins[result["winner"]] = wins.get(result["winner"], 0) + 1
+        if not options.quiet:
+            print json.dumps(result)
+            sys.stdout.flush()
+    duration = time.time() - start
+    print >>sys.stderr, "%i games in %.1f s (%.1f games/s)" % (games, duration,
+            games / max(duration, 1e-9))
+    if errors:
+        print >>sys.stderr, "%i games crashed" % (errors, )
+    for name, count in sorted(wins.items()):
+        print >>sys.stderr, "%s won %i games" % (name, count)
+    if options.profile:
+        print >>sys.stderr, profile.report()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
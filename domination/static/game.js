@@ -1,5 +1,69 @@
 do_page_refresh = true;
+pending_reload = false;
+event_source = null;
+
+function reload_page() {
+  if (do_page_refresh) {
+    document.location = document.location;
+  } else {
+    pending_reload = true;
+  }
+}
+
+function init_cards(root) {
+  $(root).find(".card").tooltip({
+    bodyHandler: function() {
+      return $($(this).find(".descriptionblock")).html()
+    },
+    showURL: false,
+    track: true
+  });
+  $(root).find(".costs").corner("10px");
+  $(root).find(".potioncosts").corner("10px");
+  $(root).find(".card").corner();
+}
+
+function apply_game_update(update) {
+  if (update.reload) {
+    event_source.close();
+    reload_page();
+    return;
+  }
+  if (update.players !== undefined) {
+    $("#players").html(update.players);
+  }
+  if (update.supply !== undefined) {
+    $.each(update.supply, function(key, html) {
+      $("#supplycount-" + key).replaceWith(html);
+    });
+  }
+  if (update.info) {
+    var items = $(update.info).filter("li");
+    items.insertBefore("#clearinfo");
+    $("#infoqueue").show();
+    init_cards(items);
+    $.scrollTo("#infoend", {offset: {top: -$(window).height()}});
+  }
+}
+
 handle_page_refresh = function () {
+  if (typeof initial_seqno == "undefined") {
+    return;
+  }
+  if (pending_reload) {
+    reload_page();
+    return;
+  }
+  if (window.EventSource) {
+    if (event_source === null) {
+      event_source = new EventSource($SCRIPT_ROOT + '/game/events/' +
+          encodeURIComponent(game_name) + '?seqno=' + initial_seqno);
+      event_source.onmessage = function(event) {
+        apply_game_update($.parseJSON(event.data));
+      };
+    }
+    return;
+  }
   var seqno = initial_seqno;
   var check_and_update = function() {
     $.getJSON($SCRIPT_ROOT + '/game/check_seqno/' + game_name, {seqno: seqno}, function(data) {
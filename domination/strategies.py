@@ -0,0 +1,203 @@
+""" Strategies of AI players. A strategy answers the requests of a player,
+most strategies only differ in what they buy and answer everything else
+like Request.choose_wisely.
+
+Strategies are given as specs:
+  wise                     buy the most expensive card (the default)
+  random                   answer everything randomly
+  bigmoney                 only buy money and victory cards
+  bigmoney+KEY[*N]         big money plus up to N (default 1) cards KEY
+  engine                   villages and drawing cards, then money
+  priority:RULE,RULE,...   buy the first buyable card of the rules
+  mcts[:ROLLOUTS[,SECONDS]] look ahead by Monte Carlo tree search
+A rule is KEY[*N][@M]: buy the card KEY if there are less than N of it in
+the deck and at most M cards are left on the Province pile. """
+
+from random import Random
+
+from domination import mcts
+from domination.gameengine import SelectDeal
+from domination.cards import CardTypeRegistry, ActionCard, manifest
+
+
+class Strategy(object):
+    name = "wise"
+
+    def __init__(self, spec=None):
+        self.spec = spec or self.name
+
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, self.spec)
+
+    def respond(self, req):
+        if isinstance(req, SelectDeal):
+            return self.buy(req)
+        return req.choose_wisely()
+
+    def buy(self, req):
+        """ Returns the key of the card to buy or None. """
+        return req.choose_wisely()
+
+    def redraw(self, req):
+        """ Draws the same random numbers from the game as respond, see
+        AIPlayer.redraw. """
+        self.respond(req)
+
+
+class RandomStrategy(Strategy):
+    name = "random"
+
+    def respond(self, req):
+        return req.choose_randomly()
+
+
+class BuyRule(object):
+    def __init__(self, key, max_count=None, max_provinces=None):
+        if key not in manifest.cards:
+            raise ValueError("Unknown card %r" % (key, ))
+        self.key = key
+        self.max_count = max_count
+        self.max_provinces = max_provinces
+
+    @classmethod
+    def parse(cls, rule):
+        max_count = max_provinces = None
+        try:
+            if "@" in rule:
+                rule, max_provinces = rule.split("@", 1)
+                max_provinces = int(max_provinces)
+            if "*" in rule:
+                rule, max_count = rule.split("*", 1)
+                max_count = int(max_count)
+        except ValueError:
+            raise ValueError("Invalid buy rule %r" % (rule, ))
+        return cls(rule.strip(), max_count, max_provinces)
+
+    def matches(self, req):
+        game = req.game
+        if self.key not in game.supply or not req.is_buyable(
+                CardTypeRegistry.keys2classes((self.key, ))[0]):
+            return False
+        if self.max_provinces is not None and \
+                len(game.supply.get("Province", ())) > self.max_provinces:
+            return False
+        if self.max_count is not None and self.max_count <= len(
+                [c for c in req.player.total_cards if c.__name__ == self.key]):
+            return False
+        return True
+
+
+class BuyPriority(Strategy):
+    """ Buys the card of the first rule that matches. """
+    name = "priority"
+
+    def __init__(self, spec):
+        Strategy.__init__(self, spec)
+        rules = spec.split(":", 1)[-1]
+        self.rules = [BuyRule.parse(rule) for rule in rules.split(",") if rule.strip()]
+        if not self.rules:
+            raise ValueError("Empty buy priority list")
+
+    def buy(self, req):
+        for rule in self.rules:
+            if rule.matches(req):
+                return rule.key
+
+
+BIG_MONEY = ["Colony", "Platinum", "Province", "Duchy@4", "Estate@2", "Gold"]
+
+class BigMoney(BuyPriority):
+    name = "bigmoney"
+
+    def __init__(self, spec="bigmoney"):
+        rules = BIG_MONEY[:]
+        if "+" in spec:
+            extra = spec.split("+", 1)[1]
+            if "*" not in extra:
+                extra += "*1"
+            rules.append(extra)
+        rules.append("Silver")
+        BuyPriority.__init__(self, ",".join(rules))
+        self.spec = spec
+
+
+class Engine(Strategy):
+    """ Builds a deck of villages and drawing cards, keeping about as many
+    villages as terminal drawers, and then buys victory cards. """
+    name = "engine"
+    green_rules = [BuyRule.parse(rule) for rule in BIG_MONEY[:5]]
+
+    def buy(self, req):
+        for rule in self.green_rules:
+            if rule.matches(req):
+                return rule.key
+        game = req.game
+        if req.money < 6:
+            actions = [c for c in req.cards if c.optional and
+                       issubclass(c, ActionCard) and req.is_buyable(c)]
+            owned = [c for c in req.player.total_cards if c.optional]
+            villages = len([c for c in owned if c.features.gives_actions])
+            drawers = len([c for c in owned if c.features.draws
+                           and not c.features.gives_actions])
+            want_village = drawers > villages
+            def key(c):
+                fits = c.features.gives_actions == want_village
+                return (fits, game.card_cost(c), c.features.attack, c.__name__)
+            if actions:
+                return max(actions, key=key).__name__
+        for key in ("Gold", "Silver"):
+            if key in game.supply and req.is_buyable(CardTypeRegistry.raw_card_classes[key]):
+                return key
+
+
+class MCTS(Strategy):
+    """ Looks ahead by Monte Carlo tree search, see domination.mcts. Spec:
+    mcts[:ROLLOUTS[,SECONDS]], the maximum number of rollouts and seconds
+    per buy. """
+    name = "mcts"
+    rollouts = 64
+    seconds = 2.0
+
+    def __init__(self, spec="mcts"):
+        Strategy.__init__(self, spec)
+        if ":" in spec:
+            try:
+                budget = [float(x) for x in spec.split(":", 1)[1].split(",")]
+            except ValueError:
+                raise ValueError("Invalid budget in %r" % (spec, ))
+            self.rollouts = int(budget[0])
+            if len(budget) > 1:
+                self.seconds = budget[1]
+        self.random = Random()
+
+    def buy(self, req):
+        return mcts.search(req, self.rollouts, self.seconds, self.random)
+
+    def redraw(self, req):
+        # the search only draws from its own generator
+        if not isinstance(req, SelectDeal):
+            self.respond(req)
+
+
+STRATEGIES = {
+    "wise": Strategy,
+    "random": RandomStrategy,
+    "bigmoney": BigMoney,
+    "engine": Engine,
+    "priority": BuyPriority,
+    "mcts": MCTS,
+}
+
+# specs offered when creating a game
+EXAMPLE_SPECS = ["wise", "random", "bigmoney", "bigmoney+Smithy", "engine",
+                 "priority:Province,Gold,Silver", "mcts"]
+
+def get_strategy(spec):
+    """ Returns the strategy described by spec, see the module docstring.
+    Raises ValueError for invalid specs. """
+    name = spec.split(":", 1)[0].split("+", 1)[0].strip()
+    if name not in STRATEGIES:
+        raise ValueError("Unknown strategy %r" % (spec, ))
+    if name == "priority" and ":" not in spec:
+        raise ValueError("A priority strategy needs a list of cards")
+    return STRATEGIES[name](spec)
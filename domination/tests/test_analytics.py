@@ -0,0 +1,35 @@
+from domination.analytics import Stats
+from domination.simulate import resolve_kingdom
+
+
+def result(winner, rounds, buys, kingdom="First Game [B]", error=None):
+    return {"kingdom": resolve_kingdom(kingdom), "players": ["a", "b"],
+            "winner": winner, "rounds": rounds, "end_reason": "provinces",
+            "error": error, "buys": buys}
+
+def test_stats(tmpdir):
+    stats = Stats()
+    stats.add(result("a", 10, [{"Smithy": 2}, {"Village": 1}]))
+    stats.add(result(None, 20, [{"Smithy": 1}, {}]))
+    stats.add(result(None, 0, None, error="Traceback"))
+    kingdom = stats.kingdom_rows()[0]
+    assert kingdom["name"] == "First Game [B]"
+    assert (kingdom["games"], kingdom["errors"]) == (3, 1)
+    assert (kingdom["rounds"], kingdom["rounds_deviation"]) == (15.0, 5.0)
+    assert kingdom["win_rates"] == [0.5, 0.0] and kingdom["ties"] == 0.5
+    assert kingdom["end_reasons"]["provinces"] == 1.0
+    cards = dict((row["key"], row) for row in stats.card_rows())
+    assert cards["Smithy"]["buys"] == 1.5 and cards["Smithy"]["buyer_win_rate"] == 0.5
+    assert cards["Village"]["buyer_win_rate"] == 0.0
+    assert cards["Cellar"]["games"] == 2 and cards["Cellar"]["buyers"] == 0
+
+    # a new batch is added to the stored counters
+    path = str(tmpdir.join("stats.bin"))
+    stats.save(path)
+    batch = Stats()
+    batch.add(result("b", 30, [{}, {"Gold": 1}], kingdom="Big Money [B]"))
+    stored = Stats.load(path)
+    stored.merge(batch)
+    stats.add(result("b", 30, [{}, {"Gold": 1}], kingdom="Big Money [B]"))
+    assert stored.kingdom_rows() == stats.kingdom_rows()
+    assert stored.card_rows() == stats.card_rows()
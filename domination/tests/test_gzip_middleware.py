@@ -0,0 +1,65 @@
+import os
+import zlib
+
+from werkzeug.test import Client
+from werkzeug.wrappers import BaseResponse, Response
+
+from domination.gzip_middleware import GzipMiddleware, compress_static
+
+
+TEXT = "Which card do you want to buy? " * 100
+
+def app(environ, start_response):
+    path = environ['PATH_INFO']
+    if path == '/image':
+        response = Response("\xff\xd8" * 500, mimetype="image/jpeg")
+    elif path == '/stream':
+        response = Response((chunk for chunk in [TEXT, TEXT]), mimetype="text/html")
+    elif path == '/write':
+        # old style applications pass (part of) the body to write
+        write = start_response('200 OK', [('Content-Type', 'text/html')])
+        write(TEXT)
+        return [TEXT]
+    else:
+        response = Response(TEXT, mimetype="text/html")
+    return response(environ, start_response)
+
+def get(app, path, **headers):
+    headers.setdefault('Accept-Encoding', 'gzip, deflate')
+    return Client(app, BaseResponse).get(path, headers=headers.items())
+
+def gunzip(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+def test_compresses_streams():
+    wrapped = GzipMiddleware(app, skip_paths=("/events/", ))
+    response = get(wrapped, '/page')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert gunzip(response.data) == TEXT
+    assert gunzip(get(wrapped, '/stream').data) == TEXT * 2
+    assert gunzip(get(wrapped, '/write').data) == TEXT * 2
+    assert get(wrapped, '/write', **{'Accept-Encoding': ''}).data == TEXT * 2
+    assert 'Content-Encoding' not in get(wrapped, '/image').headers
+    assert 'Content-Encoding' not in get(wrapped, '/events/x').headers
+    assert get(wrapped, '/page', **{'Accept-Encoding': ''}).data == TEXT
+
+def test_precompressed_static(tmpdir):
+    static = tmpdir.mkdir("static")
+    static.join("game.js").write(TEXT)
+    static.join("card.jpg").write("\xff\xd8", "wb")
+    assert compress_static(str(static)) == 1
+    assert compress_static(str(static)) == 0
+    assert os.path.exists(str(static.join("game.js.gz")))
+    wrapped = GzipMiddleware(app, static_dir=str(static))
+    response = get(wrapped, '/static/game.js')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'javascript' in response.headers['Content-Type']
+    assert gunzip(response.data) == TEXT
+    etag = response.headers['ETag']
+    response = get(wrapped, '/static/game.js', **{'If-None-Match': etag})
+    assert response.status_code == 304
+    tmpdir.join("secret.js").write("secret")
+    compress_static(str(tmpdir))
+    assert gunzip(get(wrapped, '/static/../secret.js').data) == TEXT
@@ -0,0 +1,34 @@
+from domination.gameengine import Player
+from domination.journal import Journal, encode_response, decode_response, \
+        RESPONSE, OPTION
+from domination.cards.base import Copper, Estate, Village
+
+
+def test_response_roundtrip():
+    player = Player("alice")
+    player.hand = [Copper(), Estate(), Copper()]
+    response = [player.hand[2], player.hand[1]]
+    data = encode_response(player, response)
+    assert data == {"hand": [2, 1]}
+    decoded = decode_response(player, data)
+    assert decoded[0] is player.hand[2] and decoded[1] is player.hand[1]
+    assert decode_response(player, encode_response(player, Village)) is Village
+    for response in (None, True, "Silver", ["a", "b"], []):
+        assert decode_response(player, encode_response(player, response)) == response
+
+def test_journal_read(tmpdir):
+    path = str(tmpdir.join("game.journal"))
+    journal = Journal(path)
+    player = Player("alice")
+    journal.append(RESPONSE, 0, player, "Silver")
+    journal.append(OPTION, 1, player, ["automatic_money_selection", True])
+    journal.append(RESPONSE, 1, player, None)
+    journal.close()
+    with open(path, "ab") as f:
+        f.write('["r",2,"ali')
+    assert Journal(path).read() == [["r", 0, "alice", "Silver"],
+        ["o", 1, "alice", ["automatic_money_selection", True]], ["r", 1, "alice", None]]
+    assert len(Journal(path).read(1)) == 2
+    journal.truncate()
+    journal.close()
+    assert Journal(path).read() == []
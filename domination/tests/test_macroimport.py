@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+from domination import macroimport
+
+
+MACROS = """from karnickel import macro
+
+@macro
+def double(x):
+    x * %i
+"""
+
+USER = """from macrotestpkg.macros.__macros__ import double
+
+value = double(21)
+"""
+
+
+@pytest.fixture
+def package(tmpdir, monkeypatch):
+    pkg = tmpdir.mkdir("macrotestpkg")
+    pkg.join("__init__.py").write("")
+    pkg.join("macros.py").write(MACROS % (2, ))
+    pkg.join("user.py").write(USER)
+    monkeypatch.syspath_prepend(str(tmpdir))
+    importer = macroimport.MacroImporter()
+    sys.meta_path.insert(0, importer)
+    yield pkg
+    sys.meta_path.remove(importer)
+    for name in list(sys.modules):
+        if name.startswith("macrotestpkg"):
+            del sys.modules[name]
+
+def import_user():
+    sys.modules.pop("macrotestpkg.user", None)
+    return __import__("macrotestpkg.user", None, None, ["value"])
+
+def test_cached_expansion(package, monkeypatch):
+    assert import_user().value == 42
+    cached = package.join(macroimport.CACHE_DIR).listdir()
+    assert [path.basename.startswith("user.") for path in cached] == [True]
+    def expand(self, module, source):
+        assert False, "the cached code was not used"
+    monkeypatch.setattr(macroimport.MacroImporter, "expand", expand)
+    assert import_user().value == 42
+    monkeypatch.undo()
+
+    # changed macros are expanded again, the old code is removed
+    package.join("macros.py").write(MACROS % (3, ))
+    sys.modules.pop("macrotestpkg.macros", None)
+    for importer in sys.meta_path:
+        if isinstance(importer, macroimport.MacroImporter):
+            importer.macro_hashes.clear()
+    assert import_user().value == 63
+    assert len(package.join(macroimport.CACHE_DIR).listdir()) == 1
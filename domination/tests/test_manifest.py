@@ -0,0 +1,26 @@
+import os
+import sys
+import json
+import subprocess
+
+# the cards need to be imported through the game engine
+import domination.gameengine
+from domination.cards import manifest
+
+
+def test_manifest_is_current():
+    with open(manifest.PATH) as f:
+        assert json.load(f) == json.loads(json.dumps(manifest.build())), \
+                "run domination/cards/manifest.py"
+
+def test_lazy_editions():
+    root_dir = os.path.join(os.path.dirname(__file__), "..", "..")
+    output = subprocess.check_output([sys.executable, "-c", """if 1:
+        import sys
+        from domination.simulate import play_game, resolve_kingdom
+        result = play_game((0, resolve_kingdom("Big Money [B]"), ["wise", "wise"], 100, 1))
+        assert result["error"] is None, result["error"]
+        print sorted(name for name, module in sys.modules.items()
+                     if name.startswith("domination.cards.") and module is not None)
+        """], cwd=root_dir, stderr=open(os.devnull, "w"))
+    assert output.strip() == "['domination.cards.base', 'domination.cards.manifest']"
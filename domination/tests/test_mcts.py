@@ -0,0 +1,63 @@
+import pickle
+import pytest
+from random import Random
+
+from domination import mcts
+from domination.gameengine import DominationGame, Player, SelectDeal
+from domination.cards import CardTypeRegistry
+from domination.strategies import get_strategy, MCTS
+from domination.simulate import play_game, resolve_kingdom, run_game
+
+
+class Stop(Exception):
+    pass
+
+
+def game_at_deal(round_no):
+    """ Returns a seeded game paused at a buy of the given round. """
+    game = DominationGame("clone", CardTypeRegistry.keys2classes(
+        resolve_kingdom("Big Money [B]")), 1)
+    strategy = get_strategy("bigmoney")
+    deciders = {}
+    for name in ("a", "b"):
+        player = Player(name)
+        game.players.append(player)
+        deciders[player] = strategy.respond
+    def decide(req):
+        if isinstance(req, SelectDeal) and game.round == round_no:
+            raise Stop(req)
+        return strategy.respond(req)
+    try:
+        run_game(game, dict((p, decide) for p in deciders))
+    except Stop, e:
+        return game, e.args[0]
+    assert False, "the game ended early"
+
+def test_clone():
+    game, req = game_at_deal(5)
+    state = pickle.dumps(game, -1)
+    clone = game.clone(Random(3))
+    assert clone.players[0] is not game.players[0]
+    assert clone.players[0].hand[0] is game.players[0].hand[0]
+    assert clone.supply["Gold"] is not game.supply["Gold"]
+    assert clone.card_classes is game.card_classes
+    clone.players[0].hand.pop()
+    clone.supply["Gold"].pop()
+    clone.round += 1
+    assert pickle.dumps(game, -1) == state
+
+def test_rollout():
+    game, req = game_at_deal(5)
+    reward = mcts.rollout(game.clone(Random(1)), 0, "Gold", game.round + 5)
+    assert 0.0 <= reward <= 1.0
+    assert None in mcts.candidates(req)
+    assert mcts.search(req, 8, 10, Random(1)) in mcts.candidates(req)
+
+def test_mcts_plays(monkeypatch):
+    monkeypatch.setattr(mcts, "processes", 1)
+    strategy = get_strategy("mcts:4,1")
+    assert isinstance(strategy, MCTS)
+    assert (strategy.rollouts, strategy.seconds) == (4, 1.0)
+    result = play_game((0, resolve_kingdom("Big Money [B]"), ["mcts:4", "bigmoney"],
+                        20, 1))
+    assert result["error"] is None
@@ -0,0 +1,30 @@
+from domination import metrics
+
+
+def test_render(monkeypatch):
+    monkeypatch.setattr(metrics, "registry", [])
+    counter = metrics.Counter("test_total", "A counter", ["kind"])
+    histogram = metrics.Histogram("test_seconds", "A histogram", buckets=(0.1, 1))
+    metrics.Gauge("test_games", "A gauge", ["state"], lambda: {("Fresh", ): 2})
+    counter.inc()
+    assert counter.values == {}
+    monkeypatch.setattr(metrics, "enabled", True)
+    counter.inc(2, ('a "b"', ))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+    assert metrics.render().splitlines() == [
+        "# HELP test_total A counter",
+        "# TYPE test_total counter",
+        'test_total{kind="a \\"b\\""} 2',
+        "# HELP test_seconds A histogram",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        "test_seconds_sum 5.55",
+        "test_seconds_count 3",
+        "# HELP test_games A gauge",
+        "# TYPE test_games gauge",
+        'test_games{state="Fresh"} 2',
+    ]
@@ -0,0 +1,72 @@
+from random import Random
+
+from domination.gameengine import DominationGame, Player, AIPlayer, InfoRequest, \
+        Checkpoint, EndOfGameException
+from domination.journal import encode_response, RESPONSE, OPTION
+from domination.replay import Recording, Replay
+from domination.simulate import resolve_kingdom
+from domination.strategies import get_strategy
+from domination.cards import CardTypeRegistry
+
+
+def fingerprint(game):
+    return (game.round, [[c.__name__ for c in p.hand + p.deck + p.discard_pile]
+                         for p in game.players],
+            sorted((key, len(pile)) for key, pile in game.supply.iteritems()))
+
+def record(path, rounds):
+    """ Plays a game of a human and two bots, returns the fingerprints of the
+    game before every decision. """
+    cards = CardTypeRegistry.keys2classes(resolve_kingdom("Interaction [B]"))
+    game = DominationGame("replay", cards, 42)
+    human = Player("human")
+    game.players += [human, AIPlayer("wise"), AIPlayer("random", get_strategy("random"))]
+    recording = Recording(path)
+    recording.start(game)
+    # humans do not draw from the random generator of the game
+    human_random = Random(1)
+    fingerprints = []
+    gen = game.play_game(False)
+    reply = None
+    while True:
+        try:
+            req = gen.send(reply)
+        except EndOfGameException:
+            break
+        reply = None
+        if isinstance(req, InfoRequest):
+            continue
+        if isinstance(req, Checkpoint):
+            if game.round == rounds:
+                break
+            if game.round == 2:
+                recording.append(OPTION, game.decisions, human,
+                                 ["automatic_money_selection", True])
+                human.options["automatic_money_selection"] = True
+            continue
+        fingerprints.append(fingerprint(game))
+        if req.player is human:
+            game_random, game.random = game.random, human_random
+            reply = req.choose_randomly()
+            game.random = game_random
+        elif req.player.strategy is None:
+            reply = req.choose_wisely()
+        else:
+            reply = req.player.strategy.respond(req)
+        req.seqno = game.decisions
+        recording.append(RESPONSE, game.decisions, req.player,
+                         encode_response(req.player, reply), req)
+        game.decisions += 1
+    recording.close()
+    return fingerprints
+
+def test_seek(tmpdir):
+    path = str(tmpdir.join("game.replay"))
+    fingerprints = record(path, 8)
+    replay = Replay.load(path)
+    assert len(replay) == len(fingerprints)
+    for decision in range(len(replay)) + range(len(replay))[::-7]:
+        game, req = replay.seek(decision)
+        assert fingerprint(game) == fingerprints[decision]
+        assert req is not None
+    assert replay.snapshot_decisions[0] == 0 and len(replay.snapshots) == 8
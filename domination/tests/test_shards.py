@@ -0,0 +1,37 @@
+import pytest
+
+from werkzeug.exceptions import NotFound
+from werkzeug.routing import Map, Rule
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from domination.shards import Router, shard_index
+
+
+URL_MAP = Map([Rule("/", endpoint="index"),
+               Rule("/game/<name>", endpoint="game"),
+               Rule("/create_game", endpoint="create_game", methods=["GET", "POST"]),
+               Rule("/logout", endpoint="logout")])
+
+def make_request(*args, **kwargs):
+    return Request(EnvironBuilder(*args, **kwargs).get_environ())
+
+
+def test_shard_index():
+    indexes = [shard_index("game %i" % (i, ), 4) for i in xrange(100)]
+    assert set(indexes) == set(range(4))
+    assert indexes == [shard_index(u"game %i" % (i, ), 4) for i in xrange(100)]
+    assert shard_index(u"sp\xe4l", 3) == shard_index(u"sp\xe4l".encode("utf-8"), 3)
+
+def test_router():
+    router = Router(["http://127.0.0.1:%i" % (port, ) for port in xrange(3)], URL_MAP)
+    index = shard_index("game a", 3)
+    assert router.shards_for(make_request("/game/game%20a")) == [index]
+    assert router.shards_for(make_request("/create_game", method="POST",
+                                          data={"name": "game a"})) == [index]
+    assert router.shards_for(make_request("/create_game")) == [0]
+    assert router.shards_for(make_request("/")) == [0]
+    assert router.shards_for(make_request("/unknown")) == [0]
+    assert list(router.shards_for(make_request("/logout"))) == [0, 1, 2]
+    with pytest.raises(NotFound):
+        router.shards_for(make_request("/shard/games"))
@@ -0,0 +1,46 @@
+import pytest
+
+from domination.simulate import simulate, resolve_kingdom, play_game
+from domination.profiler import Profile
+
+
+def test_resolve_kingdom():
+    keys = resolve_kingdom("First Game [B]")
+    assert "Cellar" in keys and len(keys) == 10
+    assert len(resolve_kingdom("random")) == 10
+    with pytest.raises(ValueError):
+        resolve_kingdom("Cellar,Market")
+
+def test_play_game():
+    result = play_game((0, resolve_kingdom("Big Money [B]"), ["wise", "random"], 100, None))
+    assert result["error"] is None
+    assert len(result["points"]) == 2
+    assert result["end_reason"]
+    assert result["rounds"] > 0
+
+def test_simulate_pool():
+    kingdoms = [resolve_kingdom("First Game [B]"), resolve_kingdom("Size Distortion [B]")]
+    results = list(simulate(kingdoms, ["wise", "wise"], 2, processes=2))
+    assert sorted(r["game"] for r in results) == range(4)
+
+def test_seeded_games_are_reproducible():
+    task = (0, resolve_kingdom("Interaction [B]"), ["random", "wise", "random"], 100, 42)
+    first, second = play_game(task), play_game(task)
+    for key in ("points", "rounds", "end_reason", "winner"):
+        assert first[key] == second[key]
+
+def test_profile():
+    task = (0, resolve_kingdom("Interaction [B]"), ["wise", "wise"], 100, 42)
+    result = play_game(task, profile=True)
+    assert result["points"] == play_game(task)["points"]
+    profile = Profile()
+    profile.merge(result["profile"])
+    profile.merge(result["profile"])
+    stats = dict(((kind, card), (calls, requests)) for kind, card, calls, requests,
+                 wall, cpu in result["profile"])
+    assert stats[("play", "Copper")][1] == 0
+    assert stats[("on_buy_card", "Card")][0] > 0
+    assert sum(requests for calls, requests in stats.values()) > 0
+    calls = profile.stats[("play", "Copper")][0]
+    assert calls == 2 * stats[("play", "Copper")][0]
+    assert "Copper" in profile.report()
@@ -0,0 +1,38 @@
+import pytest
+
+from domination.strategies import get_strategy, BigMoney, BuyPriority, Engine
+from domination.evaluate import wilson_interval, evaluate
+from domination.simulate import play_game, resolve_kingdom
+
+
+def test_get_strategy():
+    assert isinstance(get_strategy("bigmoney"), BigMoney)
+    assert isinstance(get_strategy("engine"), Engine)
+    strategy = get_strategy("bigmoney+Smithy*2")
+    assert [r.key for r in strategy.rules][-2:] == ["Smithy", "Silver"]
+    assert strategy.rules[-2].max_count == 2
+    strategy = get_strategy("priority:Province,Duchy@4,Silver")
+    assert isinstance(strategy, BuyPriority)
+    assert strategy.rules[1].max_provinces == 4
+    for spec in ("nonsense", "priority", "priority:Nonsense", "bigmoney+Smithy*x"):
+        with pytest.raises(ValueError):
+            get_strategy(spec)
+
+def test_strategies_play():
+    kingdom = resolve_kingdom("Big Money [B]")
+    result = play_game((0, kingdom, ["bigmoney+Smithy", "engine", "priority:Gold,Silver"],
+                        100, 1))
+    assert result["error"] is None
+    assert result["end_reason"]
+
+def test_wilson_interval():
+    low, high = wilson_interval(50, 100)
+    assert low < 0.5 < high
+    assert abs(low - 0.4038) < 0.001 and abs(high - 0.5962) < 0.001
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+
+def test_evaluate():
+    stats = evaluate("bigmoney", "random", [resolve_kingdom("First Game [B]")], 3,
+                     processes=1, seed=1)
+    assert sum(stats.values()) == 6
+    assert stats["wins"] > stats["losses"]
@@ -0,0 +1,37 @@
+import pytest
+
+from domination.userstore import MemoryUserStore, SQLiteUserStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmpdir):
+    if request.param == "memory":
+        return MemoryUserStore()
+    return SQLiteUserStore(str(tmpdir.join("users.sqlite")))
+
+def test_users(store):
+    assert not store.has_user(u"alice")
+    assert store.add_user(u"alice")
+    assert not store.add_user(u"alice")
+    assert store.has_user(u"alice")
+    store.remove_user(u"alice")
+    assert not store.has_user(u"alice")
+
+def test_seats(store):
+    store.add_seat(u"alice", u"game a", u"alice")
+    store.add_seat(u"alice", u"game b", u"alice")
+    store.add_seat(u"bob", u"game a", u"bob")
+    assert store.get_seat(u"alice", u"game a") == u"alice"
+    assert store.get_seat(u"alice", u"game c") is None
+    assert store.get_seats(u"alice") == {u"game a": u"alice", u"game b": u"alice"}
+    assert store.get_user(u"game a", u"bob") == u"bob"
+    store.remove_seat(u"bob", u"game a")
+    assert store.get_user(u"game a", u"bob") is None
+    assert store.get_seats(u"bob") == {}
+    store.remove_game(u"game a")
+    assert store.get_seats(u"alice") == {u"game b": u"alice"}
+
+def test_shared_file(tmpdir):
+    path = str(tmpdir.join("users.sqlite"))
+    SQLiteUserStore(path).add_seat(u"alice", u"game a", u"alice")
+    assert SQLiteUserStore(path).get_seat(u"alice", u"game a") == u"alice"
@@ -21,10 +21,7 @@ class Translatable(unicode):
         raise NotImplementedError
 
     def __unicode__(self):
-        t = get_translations()
-        if t is None:
-            return self % self.parameters
-        return t.ugettext(self[:]) % self.parameters
+        return translate(self[:]) % self.parameters
 
     def __reduce__(self):
         return (Translatable, (self.pristine_str, self.parameters))
@@ -50,34 +47,72 @@ def taint_filename(basename):
 
 
 def get_translations():
-    """ Load .po file, cache .mo file repr in memory and return
-    a Babel Translations object. This function is meant for monkey patching
-    into Flask-Babel."""
+    """ Return the Babel Translations object of the locale of the current
+    request. The catalogs are loaded once per locale, after that no lock is
+    taken. This function is meant for monkey patching into Flask-Babel."""
     ctx = _request_ctx_stack.top
     if ctx is None:
         return None
     translations_dict = ctx.app.babel_translations_dict
-    lock = ctx.app.babel_translations_lock
     locale = str(get_locale())
-    lock.acquire()
-    if translations_dict.get(locale) is None:
-        mo_file = StringIO()
-        dirname = os.path.join(ctx.app.root_path, 'translations')
-        transfilename = os.path.join(dirname, taint_filename(locale),
-                'LC_MESSAGES', "messages.po")
-        if os.path.exists(transfilename):
-            catalog = read_po(file(transfilename, "r"))
-            write_mo(mo_file, catalog)
-            mo_file.seek(0)
-            translations = Translations(fileobj=mo_file)
-        else:
-            translations = gettext.NullTranslations()
-        translations_dict[locale] = translations
-    else:
-        translations = translations_dict[locale]
-    lock.release()
+    translations = translations_dict.get(locale)
+    if translations is None:
+        lock = ctx.app.babel_translations_lock
+        lock.acquire()
+        try:
+            translations = translations_dict.get(locale)
+            if translations is None:
+                dirname = os.path.join(ctx.app.root_path, 'translations')
+                translations = translations_dict[locale] = load_translations(
+                        dirname, locale)
+        finally:
+            lock.release()
     return translations
 
+def load_translations(dirname, locale):
+    """ Load the compiled .mo file of locale. If it is missing or older than
+    the .po file, the .po file is compiled and the result is written to
+    disk for the next start. """
+    dirname = os.path.join(dirname, taint_filename(locale), 'LC_MESSAGES')
+    po_filename = os.path.join(dirname, "messages.po")
+    mo_filename = os.path.join(dirname, "messages.mo")
+    if not os.path.exists(po_filename):
+        if os.path.exists(mo_filename):
+            return Translations(fileobj=file(mo_filename, "rb"))
+        return gettext.NullTranslations()
+    if not os.path.exists(mo_filename) or \
+            os.path.getmtime(mo_filename) < os.path.getmtime(po_filename):
+        mo_file = StringIO()
+        write_mo(mo_file, read_po(file(po_filename, "r")))
+        try:
+            f = file(mo_filename + ".tmp", "wb")
+            f.write(mo_file.getvalue())
+            f.close()
+            os.rename(mo_filename + ".tmp", mo_filename)
+        except (IOError, OSError):
+            pass # read-only installation, compile again next time
+        mo_file.seek(0)
+        return Translations(fileobj=mo_file)
+    return Translations(fileobj=file(mo_filename, "rb"))
+
+def translate(string):
+    """ Return the translation of string in the current request. The
+    translations are memoized per request, pages render the same strings
+    many times. """
+    ctx = _request_ctx_stack.top
+    if ctx is None:
+        return string
+    key = (string, get_locale())
+    try:
+        return ctx.translation_memo[key]
+    except AttributeError:
+        ctx.translation_memo = {}
+    except KeyError:
+        pass
+    t = get_translations()
+    translated = ctx.translation_memo[key] = string if t is None else t.ugettext(string)
+    return translated
+
 def ngettext(sing, plu, n, args=None):
     raise NotImplementedError
 
@@ -0,0 +1,159 @@
+""" Stores the logged in users and their seats in the games. A seat is the
+name of the player of a user in a game, the games and players themselves stay
+in the process that runs them. Every lookup is indexed, by user, by game and
+by seat. MemoryUserStore keeps them in the server process, SQLiteUserStore in
+a database file that several server processes can share, e.g. the shards
+started by shards.py. """
+
+import sqlite3
+from threading import Lock
+
+
+class UserStore(object):
+    def add_user(self, username):
+        """ Adds the user, returns False if it was known already. """
+        raise NotImplementedError
+
+    def has_user(self, username):
+        raise NotImplementedError
+
+    def remove_user(self, username):
+        """ Removes the user, its seats are removed with remove_seat. """
+        raise NotImplementedError
+
+    def add_seat(self, username, game_name, seat):
+        raise NotImplementedError
+
+    def remove_seat(self, username, game_name):
+        raise NotImplementedError
+
+    def get_seat(self, username, game_name):
+        """ Returns the seat of the user in the game or None. """
+        raise NotImplementedError
+
+    def get_seats(self, username):
+        """ Returns a dict mapping the game names to the seats of the user. """
+        raise NotImplementedError
+
+    def get_user(self, game_name, seat):
+        """ Returns the user sitting on seat in the game or None. """
+        raise NotImplementedError
+
+    def remove_game(self, game_name):
+        """ Removes the seats of all users in the game. """
+        raise NotImplementedError
+
+
+class MemoryUserStore(UserStore):
+    def __init__(self):
+        self.lock = Lock()
+        self.users = {} # username -> {game name: seat}
+        self.games = {} # game name -> {seat: username}
+
+    def add_user(self, username):
+        with self.lock:
+            if username in self.users:
+                return False
+            self.users[username] = {}
+            return True
+
+    def has_user(self, username):
+        return username in self.users
+
+    def remove_user(self, username):
+        with self.lock:
+            self.users.pop(username, None)
+
+    def add_seat(self, username, game_name, seat):
+        with self.lock:
+            self.remove_seat_unlocked(username, game_name)
+            other = self.games.get(game_name, {}).get(seat)
+            if other is not None:
+                self.remove_seat_unlocked(other, game_name)
+            self.users.setdefault(username, {})[game_name] = seat
+            self.games.setdefault(game_name, {})[seat] = username
+
+    def remove_seat(self, username, game_name):
+        with self.lock:
+            self.remove_seat_unlocked(username, game_name)
+
+    def remove_seat_unlocked(self, username, game_name):
+        seat = self.users.get(username, {}).pop(game_name, None)
+        if seat is not None:
+            seats = self.games[game_name]
+            del seats[seat]
+            if not seats:
+                del self.games[game_name]
+
+    def get_seat(self, username, game_name):
+        return self.users.get(username, {}).get(game_name)
+
+    def get_seats(self, username):
+        return dict(self.users.get(username, {}))
+
+    def get_user(self, game_name, seat):
+        return self.games.get(game_name, {}).get(seat)
+
+    def remove_game(self, game_name):
+        with self.lock:
+            for username in self.games.pop(game_name, {}).itervalues():
+                self.users.get(username, {}).pop(game_name, None)
+
+
+class SQLiteUserStore(UserStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS seats (username TEXT, game TEXT, seat TEXT,
+                                          PRIMARY KEY (username, game));
+        CREATE UNIQUE INDEX IF NOT EXISTS seats_by_game ON seats (game, seat);
+    """
+
+    def __init__(self, path, timeout=10):
+        # the connection is shared by the request threads, sqlite3 locks
+        # the file against the other processes
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, timeout, check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.executescript(self.SCHEMA)
+
+    def execute(self, query, args=()):
+        with self.lock:
+            return self.connection.execute(query, args).fetchall()
+
+    def add_user(self, username):
+        with self.lock:
+            cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO users VALUES (?)", (username, ))
+            return cursor.rowcount == 1
+
+    def has_user(self, username):
+        return bool(self.execute("SELECT 1 FROM users WHERE username = ?",
+                                 (username, )))
+
+    def remove_user(self, username):
+        self.execute("DELETE FROM users WHERE username = ?", (username, ))
+
+    def add_seat(self, username, game_name, seat):
+        self.execute("INSERT OR REPLACE INTO seats VALUES (?, ?, ?)",
+                     (username, game_name, seat))
+
+    def remove_seat(self, username, game_name):
+        self.execute("DELETE FROM seats WHERE username = ? AND game = ?",
+                     (username, game_name))
+
+    def get_seat(self, username, game_name):
+        rows = self.execute("SELECT seat FROM seats WHERE username = ? AND game = ?",
+                            (username, game_name))
+        return rows[0][0] if rows else None
+
+    def get_seats(self, username):
+        return dict(self.execute("SELECT game, seat FROM seats WHERE username = ?",
+                                 (username, )))
+
+    def get_user(self, game_name, seat):
+        rows = self.execute("SELECT username FROM seats WHERE game = ? AND seat = ?",
+                            (game_name, seat))
+        return rows[0][0] if rows else None
+
+    def remove_game(self, game_name):
+        self.execute("DELETE FROM seats WHERE game = ?", (game_name, ))